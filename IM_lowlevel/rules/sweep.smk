@@ -0,0 +1,26 @@
+def sweep_grid_options():
+    grid = config["sweep"]["grid"]
+    return " ".join(f"--{k} " + " ".join(str(v) for v in grid[k]) for k in grid)
+
+rule sweep_two_deme_IM:
+    input:
+        "testcode/sweep_two_deme_IM.py",
+        "testcode/build_two_deme_IM_model.py",
+        "testcode/integrate_two_deme_IM_model_moments.py",
+        "testcode/run_two_deme_IM_model.py",
+    output:
+        "output/sweep/residuals.csv",
+    params:
+        grid=sweep_grid_options(),
+        nreps=config["sweep"]["nreps"],
+        ancestry=config["ancestry"],
+        pool=burnin_pool_option(),
+        memory=memory_budget_option(),
+        stat_mode=config["stat_mode"],
+    threads: RUN_THREADS
+    shell:
+        """
+        python3 testcode/sweep_two_deme_IM.py {params.grid} --theta 100. --nsam 15 \
+            --ancestry {params.ancestry} --outroot output/sweep --nreps {params.nreps} \
+            --nworkers {threads} {params.pool} {params.memory} --stat_mode {params.stat_mode}
+        """
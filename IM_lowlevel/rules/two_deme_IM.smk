@@ -0,0 +1,148 @@
+# One set of rules for every scenario in scenarios.tsv.
+# Build and integrate rules take the scenario as a wildcard.
+# The plot rules are generated in a loop, because each
+# plot has its own report caption.
+
+def scenario_dir(name):
+    return f"output/demographic_models/{name}"
+
+rule build_two_deme_IM:
+    input:
+        "testcode/build_two_deme_IM_model.py",
+        "scenarios.tsv",
+    output:
+        "output/demographic_models/{scenario}/model.pickle",
+    params:
+        ancestry=config["ancestry"],
+        s=lambda wildcards: SCENARIOS[wildcards.scenario],
+    threads: 1
+    shell:
+        """
+        python3 testcode/build_two_deme_IM_model.py --Nref {params.s[Nref]} \
+            --N0 {params.s[N0]} --N1 {params.s[N1]} --split {params.s[split]} \
+            -T {params.s[tsplit]} --migrate {params.s[m01]} {params.s[m10]} \
+            --theta {params.s[theta]} --ancestry {params.ancestry} \
+            --sample_times {params.s[sample_times]} \
+            --outdir output/demographic_models/{wildcards.scenario}
+        """
+
+rule integrate_two_deme_IM_moments:
+    input:
+        "testcode/integrate_two_deme_IM_model_moments.py",
+        "scenarios.tsv",
+    output:
+        "output/demographic_models/{scenario}/moments.fs",
+        "output/demographic_models/{scenario}/moments_time_series.npz",
+    params:
+        s=lambda wildcards: SCENARIOS[wildcards.scenario],
+    threads: 1
+    shell:
+        """
+        OMP_NUM_THREADS=1 python3 testcode/integrate_two_deme_IM_model_moments.py \
+            --N0 {params.s[N0]} --N1 {params.s[N1]} --split {params.s[split]} \
+            -T {params.s[tsplit]} --migrate {params.s[m01]} {params.s[m10]} \
+            --nsam {params.s[nsam]} --sample_times {params.s[sample_times]} \
+            --fsfile {output[0]} --time_series_file {output[1]}
+        """
+
+# All scenarios share one pool of workers, so that the
+# replicates of one scenario fill the cores left idle
+# while the last replicates of another one finish.
+rule run_two_deme_IM_scenarios:
+    input:
+        "testcode/run_two_deme_IM_model.py",
+        "testcode/run_two_deme_IM_scenarios.py",
+        "scenarios.tsv",
+        expand("output/demographic_models/{scenario}/model.pickle", scenario=SCENARIOS),
+    output:
+        expand("output/demographic_models/{scenario}/{f}", scenario=SCENARIOS,
+            f=["results.npy", "caption.rst", "timings.jsonl"]),
+    params:
+        nreps=expand("{nreps}", nreps=config["nreps"]),
+        pool=burnin_pool_option(),
+        memory=memory_budget_option(),
+        archive=archive_option(),
+        statistics=statistics_option(),
+        stat_mode=config["stat_mode"],
+    threads: RUN_THREADS
+    shell:
+        """
+        python3 testcode/run_two_deme_IM_scenarios.py --scenarios scenarios.tsv \
+            --outroot output/demographic_models --nreps {params.nreps} --nworkers {threads} \
+            {params.pool} {params.memory} {params.archive} {params.statistics} \
+            --stat_mode {params.stat_mode}
+        """
+
+for name, s in SCENARIOS.items():
+    rule:
+        name: f"plot_{name}"
+        input:
+            "testcode/plot_two_deme_IM_results.py",
+            f"{scenario_dir(name)}/moments.fs",
+            f"{scenario_dir(name)}/results.npy",
+            f"{scenario_dir(name)}/caption.rst",
+        output:
+            report(f"{scenario_dir(name)}/results.png",
+                caption=f"../{scenario_dir(name)}/caption.rst",
+                category="Two deme IM")
+        params:
+            workdir=scenario_dir(name),
+            theta=s["theta"],
+        shell:
+            """
+            python3 testcode/plot_two_deme_IM_results.py --workdir {params.workdir} \
+                --moments_theta {params.theta}
+            """
+
+# Scenarios with sample_times also get a plot of the
+# statistics at each time.
+for name, s in SCENARIOS.items():
+    if len(s["sample_times"].split()) == 0:
+        continue
+    rule:
+        name: f"plot_{name}_time_series"
+        input:
+            "testcode/plot_two_deme_IM_time_series.py",
+            f"{scenario_dir(name)}/moments_time_series.npz",
+            f"{scenario_dir(name)}/results.npy",
+            f"{scenario_dir(name)}/caption.rst",
+        output:
+            report(f"{scenario_dir(name)}/time_series.png",
+                caption=f"../{scenario_dir(name)}/caption.rst",
+                category="Two deme IM time series"),
+            f"{scenario_dir(name)}/time_series.csv",
+        params:
+            workdir=scenario_dir(name),
+            theta=s["theta"],
+        shell:
+            """
+            python3 testcode/plot_two_deme_IM_time_series.py --workdir {params.workdir} \
+                --moments_theta {params.theta}
+            """
+
+# Spectra projected to the smaller sample sizes
+# in project_nsam.
+for name, s in SCENARIOS.items():
+    if len(config.get("project_nsam", [])) == 0:
+        continue
+    rule:
+        name: f"plot_{name}_projections"
+        input:
+            "testcode/plot_two_deme_IM_projections.py",
+            f"{scenario_dir(name)}/moments.fs",
+            f"{scenario_dir(name)}/results.npy",
+            f"{scenario_dir(name)}/caption.rst",
+        output:
+            report(f"{scenario_dir(name)}/projections.png",
+                caption=f"../{scenario_dir(name)}/caption.rst",
+                category="Two deme IM projections"),
+            f"{scenario_dir(name)}/projections.csv",
+        params:
+            workdir=scenario_dir(name),
+            theta=s["theta"],
+            project_nsam=" ".join(str(i) for i in config.get("project_nsam", [])),
+        shell:
+            """
+            python3 testcode/plot_two_deme_IM_projections.py --workdir {params.workdir} \
+                --moments_theta {params.theta} --project_nsam {params.project_nsam}
+            """
@@ -20,12 +20,22 @@ def build_demography(args):
 
     1. The input migration rates are in units of 2*Nref
     2. The time since the split is also in units of 2*Nref
+
+    When the ancestry comes from msprime, there is no burn-in
+    and the split happens in the first simulated generation.
     """
     two_deme_IM = fwdpy11.demographic_models.IM.two_deme_IM
 
     # Rescale input migration rates
     migrates = tuple(i / (2.0 * args.Nref) for i in args.migrates)
 
+    # An event at generation 0 never happens (see
+    # testutils.ancestry.burnin_end), so with msprime
+    # ancestry the split is at generation 1.
+    burnin = 20.0
+    if args.ancestry == "msprime":
+        burnin = 1.0 / args.Nref
+
     # Change split time from generations/(2*Nref) to
     # generations/Nref.
     dmodel = two_deme_IM(
@@ -34,7 +44,7 @@ def build_demography(args):
         args.split,
         (args.N0, args.N1),
         migrates,
-        burnin=20.0,
+        burnin=burnin,
     )
     simlen = int(dmodel.metadata.split_time + dmodel.metadata.gens_post_split)
     N0 = np.rint(args.N0 * args.Nref).astype(int)
@@ -74,20 +84,62 @@ def build_parameters_dict(args):
     return pdict, simlen, finalNs
 
 
-if __name__ == "__main__":
-    parser = testutils.two_deme_IM_argument_parser.make_model_builder_parser()
-    args = parser.parse_args(sys.argv[1:])
+def sample_generations(sample_times, Nref, demography, simlen):
+    """
+    The generations at which to sample for each of
+    sample_times, which are in units of 2*Nref
+    generations since the split.  The end of the
+    simulation is generation simlen.
+    """
+    split_time = int(demography.metadata.split_time)
+    generations = [split_time + int(np.rint(2.0 * Nref * t)) for t in sample_times]
+    for t, g in zip(sample_times, generations):
+        if t < 0.0 or g >= simlen:
+            raise ValueError(f"sample time {t} is not before the end of the simulation")
+    if len(set(generations)) != len(generations):
+        raise ValueError("sample times must be at least one generation apart")
+    return generations
+
+
+def build_model(args):
+    """
+    The model dict that is pickled for
+    run_two_deme_IM_model.py
+    """
+    if args.ancestry == "msprime" and args.gamma is not None:
+        raise ValueError("msprime ancestry requires neutral mutations")
 
     pdict, simlen, finalNs = build_parameters_dict(args)
+    sample_times = sorted(args.sample_times)
 
-    model = {
+    return {
         "pdict": pdict,
         "Nref": args.Nref,
         "genome_length": 1.0,
         "final_deme_sizes": finalNs,
         "theta": args.theta,
+        "rho": args.rho,
+        "ancestry": args.ancestry,
         "mutations_are_neutral": args.gamma is None,
+        "sample_times": sample_times,
+        "sample_generations": sample_generations(
+            sample_times, args.Nref, pdict["demography"], simlen
+        ),
     }
 
+
+if __name__ == "__main__":
+    parser = testutils.two_deme_IM_argument_parser.make_model_builder_parser()
+    parser.add_argument(
+        "--ancestry",
+        type=str,
+        choices=["forward", "msprime"],
+        default="forward",
+        help="Use a forward burn-in or msprime for the ancestral population.",
+    )
+    args = parser.parse_args(sys.argv[1:])
+
+    model = build_model(args)
+
     with open(args.outdir + "/model.pickle", "wb") as f:
         pickle.dump(model, f)
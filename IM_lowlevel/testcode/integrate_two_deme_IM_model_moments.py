@@ -1,8 +1,10 @@
+import os
 import sys
 
 import moments
 import numpy as np
 
+import testutils.moments_cache
 import testutils.two_deme_IM_argument_parser
 
 
@@ -35,6 +37,19 @@ def IM_moments(params, ns, gamma=0.0, h=0.5):
         Aa : 1+2hs
         AA : 1+2s
     """
+    return IM_moments_series(params, ns, [], gamma, h)[-1]
+
+
+def IM_moments_series(params, ns, times, gamma=0.0, h=0.5):
+    """
+    The expected FS of IM_moments at each of times, and
+    then at T, from a single integration.
+
+    times: sorted times since the split (in 2Nref generations),
+           each less than T
+
+    Returns a list of len(times) + 1 spectra.
+    """
     s, nu1, nu2, T, m12, m21 = params
     # equilibrium frequency spectrum
     sts = moments.LinearSystem_1D.steady_state_1D(ns[0] + ns[1], gamma=gamma, h=h)
@@ -55,22 +70,69 @@ def IM_moments(params, ns, gamma=0.0, h=0.5):
     def nu_func(t):
         return [nu1_func(t), nu2_func(t)]
 
-    # integrate for time T
-    fs.integrate(
-        nu_func, T, m=np.array([[0, m12], [m21, 0]]), gamma=[gamma, gamma], h=[h, h]
-    )
-    return fs
+    # integrate to each time in turn, up to T
+    spectra = []
+    start = 0.0
+    for t in list(times) + [T]:
+        if t > start:
+            fs.integrate(
+                lambda x, start=start: nu_func(start + x),
+                t - start,
+                m=np.array([[0, m12], [m21, 0]]),
+                gamma=[gamma, gamma],
+                h=[h, h],
+            )
+        spectra.append(fs.copy())
+        start = t
+    return spectra
+
+
+def cached_IM_moments(cache, params, ns, gamma=0.0, h=0.5):
+    """
+    IM_moments, using the moments_cache.MomentsCache cache.
+    """
+    parameters = {
+        "model": "IM_moments",
+        "params": list(params),
+        "ns": list(ns),
+        "gamma": gamma,
+        "h": h,
+    }
+    return cache.spectrum(parameters, lambda: IM_moments(params, ns, gamma, h))
 
 
-if __name__ == "__main__":
-    parser = testutils.two_deme_IM_argument_parser.make_model_builder_parser()
-    parser.add_argument(
-        "--fsfile", type=str, default=None, help="File name to write out the fs"
-    )
-    parser.add_argument(
-        "--nsam", type=int, default=None, help="Sample size (no. diploids)"
-    )
-    args = parser.parse_args(sys.argv[1:])
+def cached_IM_moments_series(cache, params, ns, times, gamma=0.0, h=0.5):
+    """
+    IM_moments_series, caching the spectrum at each time.
+    """
+    keys = [
+        cache.key(
+            {
+                "model": "IM_moments_series",
+                "params": list(params),
+                "ns": list(ns),
+                "gamma": gamma,
+                "h": h,
+                "time": t,
+            }
+        )
+        for t in list(times) + [params[3]]
+    ]
+    spectra = [cache.get(k) for k in keys]
+    if any(fs is None for fs in spectra):
+        spectra = IM_moments_series(params, ns, times, gamma, h)
+        for k, fs in zip(keys, spectra):
+            cache.put(k, fs)
+    return spectra
+
+
+def moments_arguments(args):
+    """
+    The params, ns, gamma and h of IM_moments for a model.
+
+    args - the options of make_model_builder_parser,
+           and nsam
+    """
     moments_params = (
         args.split,
         args.N0,
@@ -83,7 +145,77 @@ if __name__ == "__main__":
     mgamma = args.gamma
     if mgamma is None:
         mgamma = 0.0
-    moments_fs = IM_moments(moments_params, moments_nsam, mgamma, args.H / 2.0)
+    return moments_params, moments_nsam, mgamma, args.H / 2.0
+
+
+def integrate_model(args, cache):
+    """
+    The expected fs of a model, with theta = 1.
+
+    args - the options of make_model_builder_parser,
+           and nsam
+    cache - a moments_cache.MomentsCache
+    """
+    return cached_IM_moments(cache, *moments_arguments(args))
+
+
+def integrate_time_series(args, cache):
+    """
+    The expected fs of a model at each of args.sample_times,
+    and then at args.tsplit, with theta = 1.
+    """
+    params, ns, gamma, h = moments_arguments(args)
+    return cached_IM_moments_series(
+        cache, params, ns, sorted(args.sample_times), gamma, h
+    )
+
 
-    with open(args.fsfile, "w") as f:
+def write_model_fs(args, cache, fsfile):
+    """
+    Write the output of integrate_model to fsfile.
+    """
+    moments_fs = integrate_model(args, cache)
+    tmpfile = f"{fsfile}.{os.getpid()}.tmp"
+    with open(tmpfile, "w") as f:
         moments_fs.to_file(f)
+    os.replace(tmpfile, fsfile)
+
+
+def write_time_series(args, cache, outfile):
+    """
+    Write the output of integrate_time_series to outfile,
+    as .npz with the times and the stacked spectra.
+    """
+    spectra = integrate_time_series(args, cache)
+    tmpfile = f"{outfile}.{os.getpid()}.tmp"
+    with open(tmpfile, "wb") as f:
+        np.savez(
+            f,
+            times=np.array(sorted(args.sample_times) + [args.tsplit]),
+            fs=np.array([i.data for i in spectra]),
+        )
+    os.replace(tmpfile, outfile)
+
+
+if __name__ == "__main__":
+    parser = testutils.two_deme_IM_argument_parser.make_model_builder_parser()
+    parser.add_argument(
+        "--fsfile", type=str, default=None, help="File name to write out the fs"
+    )
+    parser.add_argument(
+        "--nsam", type=int, default=None, help="Sample size (no. diploids)"
+    )
+    parser.add_argument(
+        "--time_series_file",
+        type=str,
+        default=None,
+        help="Also write the fs at each of --sample_times, and at the end, "
+        "to this .npz file",
+    )
+    testutils.moments_cache.add_moments_cache_options(parser)
+    args = parser.parse_args(sys.argv[1:])
+    cache = testutils.moments_cache.make_moments_cache(args)
+    write_model_fs(args, cache, args.fsfile)
+
+    if args.time_series_file is not None:
+        write_time_series(args, cache, args.time_series_file)
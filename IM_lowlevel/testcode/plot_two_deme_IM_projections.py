@@ -0,0 +1,109 @@
+import argparse
+import csv
+import sys
+
+import matplotlib.pyplot as plt
+import moments
+import numpy as np
+
+import testutils.analysis_tools
+import testutils.projection
+import testutils.residuals
+
+
+def projected_summary(stack, moments_fs, nsam):
+    """
+    Residuals and Fst of the replicates and the moments
+    fs, both projected to nsam diploids per deme.
+
+    stack - per-replicate joint fs
+    moments_fs - the moments fs, scaled by theta
+
+    Fst is the mean over replicates of the Fst of each
+    replicate's projected fs.
+
+    A projected fs is the mean over all subsamples of
+    nsam diploids, so its bins vary less than those of
+    one sample of that size, and the scaled residuals
+    of smaller sizes are expected to be below 1.
+    """
+    sizes = (2 * nsam, 2 * nsam)
+    projected = testutils.projection.project(stack, sizes)
+    model = moments_fs.project(sizes)
+    data = moments.Spectrum(projected.mean(axis=0))
+    row = {"nsam": nsam, "nreps": len(stack)}
+    row.update(testutils.residuals.two_deme_summary(model, data, len(stack)))
+    row["fst"] = testutils.analysis_tools.fst(projected).mean()
+    row["moments_fst"] = model.Fst()
+    return row
+
+
+def make_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Two deme IM model tests at smaller sample sizes.", formatter_class=ADHF
+    )
+
+    parser.add_argument(
+        "--workdir",
+        type=str,
+        default=None,
+        help="Directory where the input/output happens",
+    )
+
+    parser.add_argument(
+        "--moments_theta",
+        type=float,
+        default=None,
+        help="Scaling factor for moments fs",
+    )
+
+    parser.add_argument(
+        "--project_nsam",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Numbers of diploids per deme to project the spectra to.  "
+        "Each must be at most the number sampled.  The sampled "
+        "size is always included.",
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+
+    results = np.load(args.workdir + "/results.npy", mmap_mode="r")
+    stack = np.array(results["fs"])
+    moments_fs = args.moments_theta * moments.Spectrum.from_file(
+        args.workdir + "/moments.fs"
+    )
+
+    nsam = (stack.shape[1] - 1) // 2
+    sizes = sorted(set(args.project_nsam + [nsam]))
+    if sizes[0] < 2 or sizes[-1] > nsam:
+        raise ValueError(f"--project_nsam must be from 2 to {nsam}")
+
+    rows = [projected_summary(stack, moments_fs, n) for n in sizes]
+
+    with open(args.workdir + "/projections.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    fig, axes = plt.subplots(1, 2, figsize=(8, 4), constrained_layout=True)
+    for name in ("joint", "deme0", "deme1"):
+        axes[0].plot(sizes, [r[f"{name}_rms_z"] for r in rows], "o-", label=name)
+    axes[0].axhline(1.0, color="k", linestyle="--")
+    axes[0].set_xlabel("Diploids sampled per deme")
+    axes[0].set_title(r"RMS of $\sqrt{R}\times$ Poisson residuals")
+    axes[0].legend()
+    axes[1].plot(sizes, [r["fst"] for r in rows], "bo", label="fwdpy11")
+    axes[1].plot(sizes, [r["moments_fst"] for r in rows], "go", label="moments")
+    axes[1].set_xlabel("Diploids sampled per deme")
+    axes[1].set_title(r"$F_{st}$")
+    axes[1].legend()
+    fig.suptitle(f"No. reps = {len(stack)}")
+    plt.savefig(args.workdir + "/projections.png")
@@ -7,16 +7,40 @@ import moments
 import numpy as np
 import seaborn as sns
 
+import testutils.analysis_tools
+import testutils.bootstrap
 
-def plot_fst(fst, moments_fs, ax):
+
+def plot_fst(fst, moments_fs, ax, band=None):
+    """
+    band - None, or the (lower, upper) bootstrap
+           interval of the mean
+    """
     moments_Fst = moments_fs.Fst()
     d = sns.distplot(fst, ax=ax)
-    ax.set_title(f"Mean from sims = {fst.mean():.4f}.\nExpectation = {moments_Fst:.4f}.")
+    title = f"Mean from sims = {fst.mean():.4f}"
+    if band is not None:
+        title += f" ({band[0]:.4f}, {band[1]:.4f})"
+        ax.axvspan(band[0], band[1], color="b", alpha=0.3)
+    ax.set_title(f"{title}.\nExpectation = {moments_Fst:.4f}.")
     ax.set_xlabel(r"$F_{st}$")
     ax.axvline(moments_fs.Fst())
 
 
-def plot_marginal_fs(fs, deme, mfs, ax):
+def plot_marginal_fs(fs, deme, mfs, ax, band=None):
+    """
+    band - None, or the (lower, upper) bootstrap
+           intervals of each bin of fs
+    """
+    if band is not None:
+        ax.fill_between(
+            [i for i in range(len(fs))],
+            band[0],
+            band[1],
+            color="b",
+            alpha=0.3,
+            label="fwdpy11 95% CI",
+        )
     ax.plot([i for i in range(len(fs))], fs, "bo", label="fwdpy11")
     ax.plot([i for i in range(len(fs))], mfs.data[1:-1], "go", label="moments")
     ax.set_xlabel("Derived frequency")
@@ -24,6 +48,44 @@ def plot_marginal_fs(fs, deme, mfs, ax):
     ax.legend()
 
 
+def plot_statistic(name, values, expected, ax, band=None):
+    """
+    Mean of a statistic over replicates, per deme if it
+    has one value per deme, against moments.
+
+    values - per-replicate values
+    expected - the statistic of the moments fs
+    band - None, or the (lower, upper) bootstrap
+           interval of the mean
+
+    For ratios, such as Tajima's D and Fst, the value
+    of the expected fs is not the expected value of the
+    ratio, so small differences are expected.
+    """
+    mean = np.atleast_1d(values.mean(axis=0))
+    x = np.arange(len(mean))
+    if band is not None:
+        lower, upper = np.atleast_1d(band[0]), np.atleast_1d(band[1])
+        ax.errorbar(
+            x,
+            mean,
+            yerr=(mean - lower, upper - mean),
+            fmt="bo",
+            capsize=4,
+            label="fwdpy11 95% CI",
+        )
+    else:
+        ax.plot(x, mean, "bo", label="fwdpy11")
+    ax.plot(x, np.atleast_1d(expected), "go", label="moments")
+    ax.set_xticks(x)
+    if len(mean) > 1:
+        ax.set_xticklabels([f"Deme {i}" for i in x])
+    else:
+        ax.set_xticklabels([""])
+    ax.set_title(name)
+    ax.legend()
+
+
 def make_parser():
     ADHF = argparse.ArgumentDefaultsHelpFormatter
     parser = argparse.ArgumentParser(
@@ -44,6 +106,18 @@ def make_parser():
         help="Scaling factor for moments fs",
     )
 
+    parser.add_argument(
+        "--nboot",
+        type=int,
+        default=1000,
+        help="Number of bootstrap resamples of the replicates "
+        "for 95%% confidence intervals.  If 0, no intervals are shown.",
+    )
+
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Random number seed for the bootstrap"
+    )
+
     return parser
 
 
@@ -52,22 +126,59 @@ if __name__ == "__main__":
     args = parser.parse_args(sys.argv[1:])
 
     # Results from the foward sim
-    fst = np.memmap(args.workdir + "/fst.np", np.float64)
-    deme0 = np.memmap(args.workdir + "/deme0.np", np.float64)
-    deme1 = np.memmap(args.workdir + "/deme1.np", np.float64)
+    results = np.load(args.workdir + "/results.npy", mmap_mode="r")
+    fst = np.array(results["fst"])
+    mean_fs = results["fs"].mean(axis=0)
+    deme0, deme1 = [
+        i[0, 1:-1] for i in testutils.analysis_tools.marginalize(mean_fs[np.newaxis])
+    ]
+
+    bands = [None, None, None]
+    if args.nboot > 0:
+        rng = np.random.default_rng(args.seed)
+        marginals = testutils.analysis_tools.marginalize(np.array(results["fs"]))
+        bands = [
+            testutils.bootstrap.confidence_band(i[:, 1:-1], args.nboot, rng=rng)
+            for i in marginals
+        ]
+        bands.append(testutils.bootstrap.confidence_band(fst, args.nboot, rng=rng))
 
     # moments reults
     moments_fs = moments.Spectrum.from_file(args.workdir + "/moments.fs")
 
-    fig = plt.figure(figsize=(12, 4), constrained_layout=True)
-    gs = gridspec.GridSpec(nrows=1, ncols=3, figure=fig)
-    axes = (fig.add_subplot(gs[0]), fig.add_subplot(gs[1]), fig.add_subplot(gs[2]))
+    # Statistics recorded with --statistics, besides Fst.
+    # Spectra at earlier sample times are plotted by
+    # plot_two_deme_IM_time_series.py.
+    statistics = [
+        i for i in results.dtype.names if i not in ("seed", "fst", "fs", "time_fs")
+    ]
+
+    nrows = 1 if len(statistics) == 0 else 2
+    ncols = max(3, len(statistics))
+    fig = plt.figure(figsize=(4 * ncols, 4 * nrows), constrained_layout=True)
+    gs = gridspec.GridSpec(nrows=nrows, ncols=ncols, figure=fig)
+    axes = (
+        fig.add_subplot(gs[0, 0]),
+        fig.add_subplot(gs[0, 1]),
+        fig.add_subplot(gs[0, 2]),
+    )
 
     plot_marginal_fs(
-        deme0, 0, args.moments_theta * moments_fs.marginalize([1]), axes[0]
+        deme0, 0, args.moments_theta * moments_fs.marginalize([1]), axes[0], bands[0]
     )
     plot_marginal_fs(
-        deme1, 1, args.moments_theta * moments_fs.marginalize([0]), axes[1]
+        deme1, 1, args.moments_theta * moments_fs.marginalize([0]), axes[1], bands[1]
     )
-    plot_fst(fst, moments_fs, axes[2])
+    plot_fst(fst, moments_fs, axes[2], bands[2])
+
+    expected_fs = (args.moments_theta * moments_fs).data[np.newaxis]
+    for i, name in enumerate(statistics):
+        values = np.array(results[name])
+        band = None
+        if args.nboot > 0:
+            band = testutils.bootstrap.confidence_band(values, args.nboot, rng=rng)
+        expected = testutils.analysis_tools.STATISTICS[name](expected_fs)[0]
+        plot_statistic(name, values, expected, fig.add_subplot(gs[1, i]), band)
+
+    fig.suptitle(f"No. reps = {len(fst)}")
     plt.savefig(args.workdir + "/results.png")
@@ -0,0 +1,166 @@
+import argparse
+import csv
+import sys
+
+import matplotlib.pyplot as plt
+import moments
+import numpy as np
+
+import testutils.analysis_tools
+import testutils.bootstrap
+
+
+def time_series_stacks(results):
+    """
+    Per-replicate joint fs at each sample time, ending
+    with the fs at the end of the simulation.
+
+    Returns an array of shape (ntimes, nreps, ...).
+    """
+    stacks = [np.array(results["fs"])]
+    if "time_fs" in results.dtype.names:
+        stacks = list(np.moveaxis(np.array(results["time_fs"]), 1, 0)) + stacks
+    return np.array(stacks)
+
+
+def time_point_summary(stack, model_fs, nboot, rng):
+    """
+    Fst, pi of each deme and the joint fs residuals
+    of one sample time.
+
+    stack - per-replicate joint fs
+    model_fs - the moments fs, scaled by theta
+
+    The Poisson residuals of the mean of R replicates
+    are multiplied by sqrt(R), so that their root mean
+    square is about 1 when the simulations match moments.
+    """
+    nreps = len(stack)
+    expected = model_fs.data[np.newaxis]
+    row = {"nreps": nreps}
+    for name in ("fst", "pi"):
+        values = testutils.analysis_tools.STATISTICS[name](stack)
+        mean = np.atleast_1d(values.mean(axis=0))
+        lower, upper = mean, mean
+        if nboot > 0:
+            lower, upper = testutils.bootstrap.confidence_band(values, nboot, rng=rng)
+        moments_value = np.atleast_1d(
+            testutils.analysis_tools.STATISTICS[name](expected)[0]
+        )
+        suffixes = [""] if len(mean) == 1 else [f"_{i}" for i in range(len(mean))]
+        for i, suffix in enumerate(suffixes):
+            row[f"{name}{suffix}"] = mean[i]
+            row[f"{name}{suffix}_lower"] = np.atleast_1d(lower)[i]
+            row[f"{name}{suffix}_upper"] = np.atleast_1d(upper)[i]
+            row[f"moments_{name}{suffix}"] = moments_value[i]
+    z = np.sqrt(nreps) * moments.Inference.linear_Poisson_residual(
+        model_fs, moments.Spectrum(stack.mean(axis=0))
+    )
+    row["joint_rms_z"] = np.sqrt(np.mean(np.ma.compressed(z) ** 2))
+    return row
+
+
+def plot_series(times, rows, name, ax):
+    """
+    Simulated means, with their intervals, and moments
+    values of a statistic over time.
+    """
+    for column in [k for k in rows[0] if k.startswith(f"moments_{name}")]:
+        label = column[len("moments_") :]
+        mean = np.array([r[label] for r in rows])
+        lower = np.array([r[f"{label}_lower"] for r in rows])
+        upper = np.array([r[f"{label}_upper"] for r in rows])
+        (line,) = ax.plot(
+            times, [r[column] for r in rows], "-", label=f"moments {label}"
+        )
+        ax.errorbar(
+            times,
+            mean,
+            yerr=(mean - lower, upper - mean),
+            fmt="o",
+            color=line.get_color(),
+            capsize=4,
+            label=f"fwdpy11 {label}",
+        )
+    ax.set_xlabel(r"Time since split ($2N_{ref}$ generations)")
+    ax.set_title(name)
+    ax.legend()
+
+
+def make_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Time series plots for two deme IM model tests.", formatter_class=ADHF
+    )
+
+    parser.add_argument(
+        "--workdir",
+        type=str,
+        default=None,
+        help="Directory where the input/output happens",
+    )
+
+    parser.add_argument(
+        "--moments_theta",
+        type=float,
+        default=None,
+        help="Scaling factor for moments fs",
+    )
+
+    parser.add_argument(
+        "--nboot",
+        type=int,
+        default=1000,
+        help="Number of bootstrap resamples of the replicates "
+        "for 95%% confidence intervals.  If 0, no intervals are shown.",
+    )
+
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Random number seed for the bootstrap"
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+
+    results = np.load(args.workdir + "/results.npy", mmap_mode="r")
+    stacks = time_series_stacks(results)
+
+    # moments spectra at the same times, written by
+    # integrate_two_deme_IM_model_moments.py
+    series = np.load(args.workdir + "/moments_time_series.npz")
+    times = series["times"]
+    if len(times) != len(stacks):
+        raise ValueError(
+            f"{len(stacks)} sample times in results.npy, "
+            f"but {len(times)} in moments_time_series.npz"
+        )
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for t, stack, fs in zip(times, stacks, series["fs"]):
+        row = {"time": t}
+        row.update(
+            time_point_summary(
+                stack, args.moments_theta * moments.Spectrum(fs), args.nboot, rng
+            )
+        )
+        rows.append(row)
+
+    with open(args.workdir + "/time_series.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    fig, axes = plt.subplots(1, 3, figsize=(12, 4), constrained_layout=True)
+    plot_series(times, rows, "fst", axes[0])
+    plot_series(times, rows, "pi", axes[1])
+    axes[2].plot(times, [r["joint_rms_z"] for r in rows], "bo")
+    axes[2].axhline(1.0, color="k", linestyle="--")
+    axes[2].set_xlabel(r"Time since split ($2N_{ref}$ generations)")
+    axes[2].set_title(r"RMS of $\sqrt{R}\times$ Poisson residuals, joint fs")
+    fig.suptitle(f"No. reps = {stacks.shape[1]}")
+    plt.savefig(args.workdir + "/time_series.png")
@@ -1,84 +1,327 @@
 import concurrent.futures
+import contextlib
+import hashlib
+import os
 import pickle
 import sys
 
-import matplotlib.pyplot as plt
-import moments
 import numpy as np
-import seaborn as sns
 
 import fwdpy11
 import testutils.analysis_tools
+import testutils.burnin_pool
+import testutils.checkpoint
+import testutils.convergence
+import testutils.memory
+import testutils.results_file
+import testutils.scheduling
+import testutils.simplification
+import testutils.status
+import testutils.timing
 import testutils.two_deme_IM_argument_parser
+import testutils.worker_state
+import testutils.workers
+from two_deme_IM_worker import compile_models, runsim
 
 
-def runsim(model, num_subsamples, nsam, seed):
-    rng = fwdpy11.GSLrng(seed)
-    pop = fwdpy11.DiploidPopulation(model["Nref"], model["genome_length"])
-    fwdpy11.evolvets(rng, pop, fwdpy11.ModelParams(**model["pdict"]), 100)
-    if model["mutations_are_neutral"] is True:
-        fwdpy11.infinite_sites(rng, pop, model["theta"] / 4 / model["Nref"])
-    mean_fst = 0.0
-    deme_zero_fs = np.zeros(2 * args.nsam - 1)
-    deme_one_fs = np.zeros(2 * args.nsam - 1)
-    for _ in range(num_subsamples):
-        fs = testutils.analysis_tools.tskit_fs(pop, nsam)
-        fs = moments.Spectrum(fs)
-        mean_fst += fs.Fst()
-        deme_zero_fs += fs.marginalize([1]).data[1:-1]
-        deme_one_fs += fs.marginalize([0]).data[1:-1]
+def scenario_seed(seed, name):
+    """
+    The initial seed of a scenario run with others from
+    one --seed, so that they do not share replicate seeds.
+    It depends on the scenario's name rather than on its
+    position, so that adding scenarios does not change
+    the seeds, and checkpoints, of the others.
 
-    mean_fst /= num_subsamples
-    deme_zero_fs /= num_subsamples
-    deme_one_fs /= num_subsamples
+    Returns None if seed is None.
+    """
+    if seed is None:
+        return None
+    key = int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "little")
+    return int(np.random.SeedSequence([seed, key]).generate_state(1)[0])
 
-    return mean_fst, deme_zero_fs, deme_one_fs
 
+class ScenarioRun(object):
+    """
+    The bookkeeping of one scenario's replicates:
+    their seeds, results file, which is also their
+    checkpoint log, timings and stopping rule.
 
-if __name__ == "__main__":
-    parser = testutils.two_deme_IM_argument_parser.make_model_runner_parser()
-    parser.add_argument(
-        "--num_subsamples", type=int, default=None, help="Number of subsamples to take"
-    )
-    args = parser.parse_args(sys.argv[1:])
+    name - identifies the scenario in worker processes
+    infile - the pickled model
+    outdir - where the outputs go
+    nsam - number of diploids sampled per deme
+    num_subsamples - number of subsamples per replicate
+    args - the options from add_replicate_options
+    seed - the initial seed.  If None, one is chosen
+           at random.
+    """
+
+    def __init__(self, name, infile, outdir, nsam, num_subsamples, args, seed):
+        self.name = name
+        self.infile = infile
+        self.outdir = outdir
+        self.nsam = nsam
+        self.num_subsamples = num_subsamples
+        self.args = args
 
-    with open(args.infile, "rb") as f:
-        model = pickle.load(f)
+        with open(infile, "rb") as f:
+            model_bytes = f.read()
+        self.model = pickle.loads(model_bytes)
 
-    initial_seed = np.random.randint(0, np.iinfo(np.uint32).max, 1)[0]
-    np.random.seed(initial_seed)
+        if args.stat_mode == "branch":
+            if self.model["mutations_are_neutral"] is False:
+                raise ValueError("--stat_mode branch requires neutral mutations")
+            if args.fs_method != "tskit":
+                raise ValueError("--stat_mode branch requires --fs_method tskit")
 
-    seeds = np.random.randint(0, np.iinfo(np.uint32).max, args.nreps)
+        sample_times = self.model.get("sample_times", [])
+        if len(sample_times) > 0 and args.fs_method != "tskit":
+            raise ValueError("sample times require --fs_method tskit")
 
-    fsta = np.zeros(args.nreps)
-    mean_deme_zero_fs = np.zeros(2 * args.nsam - 1)
-    mean_deme_one_fs = np.zeros(2 * args.nsam - 1)
-    idx = 0
-    with concurrent.futures.ProcessPoolExecutor(max_workers=args.nworkers) as e:
-        futures = {
-            e.submit(runsim, model, args.num_subsamples, args.nsam, i) for i in seeds
+        # Per-replicate records besides fst, deme0, deme1 and fs
+        self.extra = list(args.statistics)
+        if len(sample_times) > 0:
+            self.extra.append("time_fs")
+
+        initial_seed = seed
+        if initial_seed is None:
+            initial_seed = np.random.randint(0, np.iinfo(np.uint32).max, 1)[0]
+
+        # See ReplicateLog for what belongs in the header.
+        header = {
+            "model": hashlib.sha256(model_bytes).hexdigest(),
+            "fwdpy11": fwdpy11.__version__,
+            "nsam": nsam,
+            "num_subsamples": num_subsamples,
+            "fs_method": args.fs_method,
+            "stat_mode": args.stat_mode,
+            "burnin_pool": args.burnin_pool is not None,
+            "archive": args.archive,
+            "statistics": args.statistics,
+            "seed": seed,
+            "records": ["fst", "deme0", "deme1", "fs"] + self.extra,
         }
-        for fut in concurrent.futures.as_completed(futures):
-            fst, d0, d1 = fut.result()
-            fsta[idx] = fst
-            idx += 1
-            mean_deme_zero_fs += d0
-            mean_deme_one_fs += d1
-
-    mean_deme_zero_fs /= args.nreps
-    mean_deme_one_fs /= args.nreps
-
-    with open(args.outdir + "/caption.rst", "w") as f:
-        f.write(f"The initial_seed was {initial_seed}.\n")
-        f.write("The model details are:\n\n::\n\n")
-        mp = fwdpy11.ModelParams(**model["pdict"])
-        for i in mp.asblack().split("\n"):
-            f.write(f"\t{i}\n")
-        f.write("\n")
-
-    with open(args.outdir + "/fst.np", "wb") as f:
-        fsta.tofile(f)
-    with open(args.outdir + "/deme0.np", "wb") as f:
-        mean_deme_zero_fs.tofile(f)
-    with open(args.outdir + "/deme1.np", "wb") as f:
-        mean_deme_one_fs.tofile(f)
+
+        fs_shape = (2 * nsam + 1, 2 * nsam + 1)
+        fields = [
+            (name, testutils.analysis_tools.statistic_shape(name, len(fs_shape)))
+            for name in args.statistics
+        ]
+        if len(sample_times) > 0:
+            # The joint fs at each sample time
+            fields.append(("time_fs", (len(sample_times),) + fs_shape))
+        # The log is also the results file.  It holds the
+        # marginal fs used by the stopping rule, so that
+        # resuming can replay it.
+        marginals = [(i, (2 * nsam - 1,)) for i in ("deme0", "deme1")]
+        self.log = testutils.checkpoint.ReplicateLog(
+            outdir + "/results.npy",
+            header,
+            initial_seed,
+            testutils.results_file.results_dtype(fs_shape, marginals + fields),
+        )
+        self.initial_seed = self.log.initial_seed
+        rng = np.random.RandomState(self.initial_seed)
+        self.seeds = rng.randint(0, np.iinfo(np.uint32).max, args.nreps)
+
+        # Replicate i starts from member i of the pool
+        self.pool = None
+        self.pool_index = {int(s): i for i, s in enumerate(self.seeds)}
+        if args.burnin_pool is not None:
+            self.pool = testutils.burnin_pool.BurninPool(
+                args.burnin_pool, self.model, args.nreps
+            )
+
+        self.monitor = testutils.convergence.ConvergenceMonitor(
+            args.target_ci_width, args.min_reps, args.nreps
+        )
+
+        # Every replicate in the log counts, so that the
+        # number of replicates is the length of the file.
+        for r in self.log.records():
+            self.monitor.update(fst=r["fst"], deme0=r["deme0"], deme1=r["deme1"])
+
+        # Resumed runs keep their timings, see TimingLog.
+        self.timings = testutils.timing.TimingLog(
+            outdir + "/timings.jsonl", len(self.log.completed) > 0
+        )
+        self.status = testutils.status.StatusWriter(
+            outdir + "/status.json", len(self.pending()), args.nworkers
+        )
+
+    def compile_args(self):
+        """
+        The arguments of compile_model for this scenario.
+        """
+        return (
+            self.model,
+            self.num_subsamples,
+            self.nsam,
+            self.args.fs_method,
+            self.args.stat_mode,
+            self.pool,
+            self.outdir + "/trees" if self.args.archive else None,
+            self.args.statistics,
+            self.infile,
+        )
+
+    def pending(self):
+        return [i for i in self.seeds if int(i) not in self.log.completed]
+
+    def done(self):
+        return self.monitor.done()
+
+    def submit(self, executor, seed):
+        return executor.submit(
+            testutils.status.run_timed,
+            runsim,
+            self.name,
+            seed,
+            self.pool_index[int(seed)],
+        )
+
+    def add(self, seed, result):
+        """
+        Record the output of runsim.
+
+        Returns the peak RSS of the worker.
+        """
+        fst, d0, d1, fs, extra, phases, rss = result
+        self.log.append(seed, fst=fst, deme0=d0, deme1=d1, fs=fs, **extra)
+        self.timings.append(seed, phases)
+        self.monitor.update(fst=fst, deme0=d0, deme1=d1)
+        return rss
+
+    def close(self):
+        self.log.close()
+        self.timings.close()
+
+    def write_caption(self, budget):
+        args = self.args
+        model = self.model
+        with open(self.outdir + "/caption.rst", "w") as f:
+            f.write(f"The initial_seed was {self.initial_seed}.\n")
+            f.write(f"The number of replicates was {self.monitor.n}.\n")
+            if args.target_ci_width is not None:
+                f.write(
+                    f"Replicates were added until the relative confidence interval "
+                    f"width was at most {args.target_ci_width} "
+                    f"(at most {args.nreps} replicates).\n"
+                )
+            if model["ancestry"] == "msprime":
+                f.write("The ancestral population was simulated with msprime.\n")
+            if args.stat_mode == "branch":
+                f.write(
+                    "Spectra are branch-mode expectations given "
+                    "each replicate's genealogies.\n"
+                )
+            if budget.peak_rss_mb is not None and budget.budget_mb is not None:
+                f.write(
+                    f"The peak memory use of a replicate was "
+                    f"{budget.peak_rss_mb:.0f} MB, so at most "
+                    f"{budget.max_in_flight()} ran at once.\n"
+                )
+            if self.pool is not None:
+                f.write(f"Burn-ins were taken from pool {self.pool.key}.\n")
+            if args.archive:
+                f.write("Tree sequences of the replicates were archived.\n")
+            if len(model.get("sample_times", [])) > 0:
+                times = ", ".join(str(i) for i in model["sample_times"])
+                f.write(
+                    f"Each replicate was also sampled at {times} "
+                    "(in units of 2Nref generations) after the split.\n"
+                )
+            if os.path.exists(testutils.simplification.metadata_file(self.infile)):
+                f.write(
+                    "The simplification interval was tuned to "
+                    f"{testutils.simplification.read_interval(self.infile)} "
+                    "generations.\n"
+                )
+            f.write("The model details are:\n\n::\n\n")
+            mp = fwdpy11.ModelParams(**model["pdict"])
+            for i in mp.asblack().split("\n"):
+                f.write(f"\t{i}\n")
+            f.write("\n")
+
+
+def interleave(runs):
+    """
+    Yields (run, seed), taking the pending seeds of
+    each ScenarioRun in turn.  A scenario is dropped
+    once it meets its stopping rule.  Because this is
+    a generator, that is checked each time a new
+    replicate is about to be submitted.
+    """
+    queues = [(r, iter(r.pending())) for r in runs]
+    while len(queues) > 0:
+        for q in list(queues):
+            run, seeds = q
+            seed = None
+            if not run.done():
+                seed = next(seeds, None)
+            if seed is None:
+                queues.remove(q)
+            else:
+                yield run, seed
+
+
+def run_scenarios(runs, nworkers, memory_budget):
+    """
+    Run the replicates of all ScenarioRuns in
+    one process pool, then write their captions.
+
+    The missing members of their burn-in pools are
+    built first, in the same process pool.  Scenarios
+    sharing a pool are submitted one after another, so
+    their replicates would otherwise all build the same
+    member at once.
+    """
+    budget = testutils.memory.MemoryBudget(memory_budget, nworkers)
+
+    with contextlib.ExitStack() as stack:
+        for r in runs:
+            stack.enter_context(r.status)
+        e = stack.enter_context(
+            concurrent.futures.ProcessPoolExecutor(
+                max_workers=nworkers,
+                mp_context=testutils.workers.pool_context(),
+                initializer=testutils.worker_state.initialize,
+                initargs=(compile_models, {r.name: r.compile_args() for r in runs}),
+            )
+        )
+        pools = {r.pool.path: r.pool for r in runs if r.pool is not None}
+        for pool in pools.values():
+            pool.build_missing(e)
+        for (run, seed), fut in testutils.scheduling.as_completed_bounded(
+            lambda task: task[0].submit(e, task[1]),
+            interleave(runs),
+            budget.max_in_flight,
+        ):
+            try:
+                pid, seconds, result = fut.result()
+            except Exception:
+                run.status.fail()
+                raise
+            run.status.add(pid, seconds)
+            budget.update(run.add(seed, result))
+
+    for r in runs:
+        r.close()
+        r.write_caption(budget)
+
+
+if __name__ == "__main__":
+    parser = testutils.two_deme_IM_argument_parser.make_model_runner_parser()
+    args = parser.parse_args(sys.argv[1:])
+    args.nworkers = testutils.workers.resolve_nworkers(args.nworkers)
+
+    run = ScenarioRun(
+        args.outdir,
+        args.infile,
+        args.outdir,
+        args.nsam,
+        args.num_subsamples,
+        args,
+        args.seed,
+    )
+    run_scenarios([run], args.nworkers, args.memory_budget)
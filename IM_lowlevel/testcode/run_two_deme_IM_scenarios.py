@@ -0,0 +1,38 @@
+import csv
+import os
+import sys
+
+import testutils.two_deme_IM_argument_parser
+import testutils.workers
+from run_two_deme_IM_model import ScenarioRun, run_scenarios, scenario_seed
+
+
+def read_scenarios(filename):
+    """
+    The rows of a tab-separated table of scenarios.
+    """
+    with open(filename, "r") as f:
+        return [row for row in csv.DictReader(f, delimiter="\t")]
+
+
+if __name__ == "__main__":
+    parser = testutils.two_deme_IM_argument_parser.make_batch_runner_parser()
+    args = parser.parse_args(sys.argv[1:])
+    args.nworkers = testutils.workers.resolve_nworkers(args.nworkers)
+
+    runs = []
+    for row in read_scenarios(args.scenarios):
+        outdir = os.path.join(args.outroot, row["name"])
+        runs.append(
+            ScenarioRun(
+                row["name"],
+                os.path.join(outdir, "model.pickle"),
+                outdir,
+                int(row["nsam"]),
+                int(row["num_subsamples"]),
+                args,
+                scenario_seed(args.seed, row["name"]),
+            )
+        )
+
+    run_scenarios(runs, args.nworkers, args.memory_budget)
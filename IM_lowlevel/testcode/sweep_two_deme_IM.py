@@ -0,0 +1,181 @@
+import argparse
+import concurrent.futures
+import itertools
+import os
+import pickle
+import sys
+
+import numpy as np
+
+import testutils.moments_cache
+import testutils.residuals
+import testutils.two_deme_IM_argument_parser
+import testutils.workers
+from build_two_deme_IM_model import build_model
+from run_two_deme_IM_model import ScenarioRun, run_scenarios, scenario_seed
+
+# Worker processes import this script again, so moments
+# and pandas are imported by the functions that use them.
+
+GRID_PARAMETERS = ["N0", "N1", "split", "tsplit", "m01", "m10"]
+
+
+def make_parser():
+    parser = testutils.two_deme_IM_argument_parser.make_sweep_parser()
+    testutils.moments_cache.add_moments_cache_options(parser)
+    parser.add_argument(
+        "--moments_workers",
+        type=int,
+        default=1,
+        help="Number of processes integrating moments spectra "
+        "while the replicates run",
+    )
+    return parser
+
+
+def grid_points(args):
+    """
+    A dict of parameter values for each grid point,
+    in the order of itertools.product.
+    """
+    values = [getattr(args, i) for i in GRID_PARAMETERS]
+    return [dict(zip(GRID_PARAMETERS, i)) for i in itertools.product(*values)]
+
+
+def point_name(point):
+    """
+    The name of a grid point, such as
+    N0=1_N1=1_split=0.5_tsplit=0.1_m01=0_m10=0.
+
+    Points are named by their values rather than by
+    their positions in the grid, so that changing the
+    grid leaves the names, seeds and output directories
+    of the other points as they were.
+    """
+    return "_".join(
+        f"{k}={np.format_float_positional(point[k], trim='-')}" for k in GRID_PARAMETERS
+    )
+
+
+def model_args(args, point):
+    """
+    The options of build_two_deme_IM_model.py and
+    integrate_two_deme_IM_model_moments.py for a
+    grid point.
+    """
+    return argparse.Namespace(
+        Nref=args.Nref,
+        N0=point["N0"],
+        N1=point["N1"],
+        split=point["split"],
+        tsplit=point["tsplit"],
+        migrates=[point["m01"], point["m10"]],
+        theta=args.theta,
+        rho=args.rho,
+        gamma=None,
+        H=1.0,
+        ancestry=args.ancestry,
+        nsam=args.nsam,
+        sample_times=[],
+    )
+
+
+def submit_integrations(executor, args, outdirs, points):
+    """
+    Submit the writing of moments.fs for every grid point
+    to executor.  Points already in the moments cache are
+    read from it.
+
+    Returns the list of futures.
+    """
+    import integrate_two_deme_IM_model_moments as integrate
+
+    cache = testutils.moments_cache.make_moments_cache(args)
+    return [
+        executor.submit(
+            integrate.write_model_fs,
+            model_args(args, point),
+            cache,
+            os.path.join(outdir, "moments.fs"),
+        )
+        for outdir, point in zip(outdirs, points)
+    ]
+
+
+def residual_statistics(outdir, theta):
+    """
+    Compare the mean fs of a grid point to moments,
+    with testutils.residuals.two_deme_summary.
+    """
+    import moments
+
+    results = np.load(os.path.join(outdir, "results.npy"), mmap_mode="r")
+    nreps = len(results)
+    model = theta * moments.Spectrum.from_file(os.path.join(outdir, "moments.fs"))
+    data = moments.Spectrum(np.array(results["fs"]).mean(axis=0))
+
+    row = {"nreps": nreps}
+    row.update(testutils.residuals.two_deme_summary(model, data, nreps))
+    row["fst"] = np.array(results["fst"]).mean()
+    row["moments_fst"] = model.Fst()
+    return row
+
+
+def residuals_table(names, outdirs, points, theta):
+    """
+    One row of residual_statistics per grid point,
+    indexed by the name of the point, with its
+    parameters.
+    """
+    import pandas as pd
+
+    rows = []
+    for name, outdir, point in zip(names, outdirs, points):
+        row = {"point": name}
+        row.update(point)
+        row.update(residual_statistics(outdir, theta))
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("point")
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+    args.nworkers = testutils.workers.resolve_nworkers(args.nworkers)
+
+    points = grid_points(args)
+    names = [point_name(i) for i in points]
+    outdirs = [os.path.join(args.outroot, i) for i in names]
+
+    for outdir, point in zip(outdirs, points):
+        os.makedirs(outdir, exist_ok=True)
+        with open(os.path.join(outdir, "model.pickle"), "wb") as f:
+            pickle.dump(build_model(model_args(args, point)), f)
+
+    # The moments spectra are integrated by their own
+    # processes while the replicates run, and are only
+    # needed for the residuals.
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.moments_workers, mp_context=testutils.workers.pool_context()
+    ) as e:
+        integrations = submit_integrations(e, args, outdirs, points)
+
+        runs = [
+            ScenarioRun(
+                name,
+                os.path.join(outdir, "model.pickle"),
+                outdir,
+                args.nsam,
+                args.num_subsamples,
+                args,
+                scenario_seed(args.seed, name),
+            )
+            for name, outdir in zip(names, outdirs)
+        ]
+        run_scenarios(runs, args.nworkers, args.memory_budget)
+
+        for f in integrations:
+            f.result()
+
+    table = residuals_table(names, outdirs, points, args.theta)
+    table.to_csv(os.path.join(args.outroot, "residuals.csv"))
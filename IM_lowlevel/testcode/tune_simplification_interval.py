@@ -0,0 +1,86 @@
+import argparse
+import pickle
+import sys
+import time
+
+import fwdpy11
+import numpy as np
+
+import testutils.memory
+import testutils.simplification
+import testutils.worker_state
+from two_deme_IM_worker import compile_model, new_population
+
+
+def make_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Tune the simplification interval of a two deme IM model",
+        formatter_class=ADHF,
+    )
+    parser.add_argument("--infile", type=str, default=None, help="Pickled model file")
+    parser.add_argument(
+        "--intervals",
+        type=int,
+        nargs="+",
+        default=[10, 25, 50, 100, 250, 500, 1000],
+        help="Simplification intervals to try",
+    )
+    parser.add_argument(
+        "--npilot", type=int, default=2, help="Number of replicates per interval"
+    )
+    parser.add_argument(
+        "--max_rss_mb",
+        type=float,
+        default=None,
+        help="Ignore intervals whose replicates used more memory than this",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random number seed")
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Print the results without writing the metadata file",
+    )
+    return parser
+
+
+def trial(interval, seed):
+    state = testutils.worker_state.get()
+    pop = new_population(state["model"], seed)
+    rng = fwdpy11.GSLrng(seed)
+    start = time.monotonic()
+    fwdpy11.evolvets(rng, pop, state["params"], interval)
+    return time.monotonic() - start, testutils.memory.peak_rss_mb()
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+
+    with open(args.infile, "rb") as f:
+        model = pickle.load(f)
+
+    np.random.seed(args.seed)
+    seeds = np.random.randint(0, np.iinfo(np.uint32).max, args.npilot)
+
+    results = testutils.simplification.benchmark(
+        compile_model,
+        (model, None, None, None, None, None),
+        trial,
+        args.intervals,
+        seeds,
+    )
+    testutils.simplification.print_results(results)
+    best = testutils.simplification.best_interval(results, args.max_rss_mb)
+    print(f"Best simplification interval: {best}")
+
+    if args.dry_run is False:
+        testutils.simplification.write_interval(
+            args.infile,
+            best,
+            {
+                "ancestry": model["ancestry"],
+                "fwdpy11": fwdpy11.__version__,
+                "trials": results,
+            },
+        )
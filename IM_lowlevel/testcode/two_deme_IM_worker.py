@@ -0,0 +1,237 @@
+"""
+The code run by worker processes of run_two_deme_IM_model.py.
+
+Workers import this module, and not the runner, so
+keep its imports to what a replicate needs.
+"""
+
+import copy
+
+import fwdpy11
+import numpy as np
+
+import testutils.analysis_tools
+import testutils.archive
+import testutils.ancestry
+import testutils.memory
+import testutils.simplification
+import testutils.timing
+import testutils.worker_state
+
+
+def compile_model(
+    model,
+    num_subsamples,
+    nsam,
+    fs_method,
+    stat_mode,
+    pool,
+    archive=None,
+    statistics=(),
+    infile=None,
+):
+    """
+    Everything about a replicate that does not depend on
+    its seed.  Run once per worker process.
+
+    pool - None, or a BurninPool to start replicates from
+    archive - None, or the directory of a TreeArchive
+    statistics - names from analysis_tools.STATISTICS to
+                 record, besides Fst
+    infile - None, or the pickled model file, whose tuned
+             simplification interval is read from the
+             metadata file next to it
+    """
+    interval = testutils.simplification.DEFAULT_INTERVAL
+    if infile is not None:
+        interval = testutils.simplification.read_interval(infile)
+    state = {
+        "model": model,
+        "num_subsamples": num_subsamples,
+        "nsam": nsam,
+        "fs_method": fs_method,
+        "stat_mode": stat_mode,
+        "pool": pool,
+        "archive": None,
+        "statistics": list(statistics),
+        # Fst is always recorded
+        "engine": testutils.analysis_tools.StatisticsEngine(
+            ["fst"] + list(statistics),
+            stat_mode,
+            model["theta"] / 4 / model["Nref"],
+        ),
+        "params": None,
+        "burnin_end": testutils.ancestry.burnin_end(
+            model["pdict"]["demography"].metadata.split_time
+        ),
+        "simplification_interval": interval,
+        # Generations at which to preserve ancient samples
+        "sample_generations": model.get("sample_generations", []),
+    }
+    # Replicates starting at generation 0 can share one
+    # ModelParams, because evolvets resets the state of
+    # the demography.  Pool members start later, so each
+    # of them needs its own copy.
+    if pool is None:
+        state["params"] = fwdpy11.ModelParams(**model["pdict"])
+    if archive is not None:
+        state["archive"] = testutils.archive.TreeArchive(archive)
+    return state
+
+
+def compile_models(scenarios):
+    """
+    scenarios - dict mapping the name of each
+                scenario to the arguments of
+                compile_model
+    """
+    return {k: compile_model(*v) for k, v in scenarios.items()}
+
+
+def new_population(model, seed):
+    """
+    The population at the start of a replicate
+    that does not use a burn-in pool.
+    """
+    if model["ancestry"] == "msprime":
+        return testutils.ancestry.msprime_population(
+            model["Nref"], model["rho"], model["genome_length"], seed
+        )
+    return fwdpy11.DiploidPopulation(model["Nref"], model["genome_length"])
+
+
+def pool_params(model, pop):
+    pdict = copy.deepcopy(model["pdict"])
+    pdict["simlen"] -= pop.generation
+    return fwdpy11.ModelParams(**pdict)
+
+
+def ancient_sampler(generations, nsam, rng):
+    """
+    A recorder for fwdpy11.evolvets that preserves nsam
+    random diploids from each deme at the end of each of
+    the given generations.
+
+    rng - the numpy.random.Generator to draw them with
+    """
+    generations = set(generations)
+
+    def record(pop, sampler):
+        if pop.generation in generations:
+            md = np.array(pop.diploid_metadata, copy=False)
+            samples = [
+                rng.choice(np.where(md["deme"] == i)[0], nsam, replace=False)
+                for i in np.unique(md["deme"])
+            ]
+            sampler.assign(np.concatenate(samples))
+
+    return record
+
+
+def chain_recorders(recorders):
+    """
+    A recorder that calls each of recorders in
+    turn, or None if there are none.
+    """
+    if len(recorders) == 0:
+        return None
+
+    def record(pop, sampler):
+        for r in recorders:
+            r(pop, sampler)
+
+    return record
+
+
+def runsim(name, seed, pool_index):
+    """
+    name - the scenario, as passed to compile_models
+    pool_index - the member of the burn-in pool to
+                 start from.  Ignored without a pool.
+    """
+    state = testutils.worker_state.get()[name]
+    model = state["model"]
+    pool = state["pool"]
+    nsam = state["nsam"]
+    timer = testutils.timing.PhaseTimer()
+    rng = fwdpy11.GSLrng(seed)
+    # Samples are drawn from a generator seeded by the
+    # replicate's seed, so that a replicate can be run
+    # again from the seed in its records.
+    nprng = np.random.default_rng(seed)
+    params = state["params"]
+    if pool is not None:
+        # run_scenarios built the pool before any replicate
+        pop = fwdpy11.DiploidPopulation.load_from_file(pool.filename(pool_index))
+        params = pool_params(model, pop)
+    else:
+        pop = new_population(model, seed)
+    timer.mark("ancestry", pop.tables)
+    recorders = []
+    if pop.generation < state["burnin_end"]:
+        recorders.append(timer.recorder("burnin", state["burnin_end"]))
+    else:
+        timer.mark("burnin", pop.tables)
+    if len(state["sample_generations"]) > 0:
+        recorders.append(ancient_sampler(state["sample_generations"], nsam, nprng))
+    fwdpy11.evolvets(
+        rng,
+        pop,
+        params,
+        state["simplification_interval"],
+        chain_recorders(recorders),
+    )
+    timer.mark("post-burnin", pop.tables)
+    mu = model["theta"] / 4 / model["Nref"]
+    if state["stat_mode"] == "site" and model["mutations_are_neutral"] is True:
+        fwdpy11.infinite_sites(rng, pop, mu)
+        timer.mark("mutations", pop.tables)
+    session = testutils.analysis_tools.SamplingSession(pop, nprng)
+    if state["stat_mode"] == "branch" or state["fs_method"] == "tskit":
+        # Convert now, so that the conversion is timed on its own.
+        session.ts
+        timer.mark("tskit", pop.tables)
+    engine = state["engine"]
+    if state["fs_method"] == "tskit":
+        sample_sets = session.subsample_nodes(nsam, state["num_subsamples"])
+        fs = engine.fs(session, sample_sets)
+    else:
+        fs = np.array(
+            [session.fs(nsam).todense() for _ in range(state["num_subsamples"])]
+        )
+    fs = fs.astype(np.float64)
+    timer.mark("fs", pop.tables)
+    deme_zero_fs, deme_one_fs = testutils.analysis_tools.marginalize(fs)
+
+    stats = engine.compute(fs)
+    mean_fst = stats["fst"].mean()
+    extra = {name: stats[name].mean(axis=0) for name in state["statistics"]}
+    deme_zero_fs = deme_zero_fs[:, 1:-1].mean(axis=0)
+    deme_one_fs = deme_one_fs[:, 1:-1].mean(axis=0)
+    timer.mark("statistics", pop.tables)
+
+    if len(state["sample_generations"]) > 0:
+        # One joint fs per sampling time, in order of time
+        extra["time_fs"] = np.array(
+            [
+                engine.fs(session, sample_sets).mean(axis=0)
+                for _, sample_sets in session.ancient_sample_nodes()
+            ]
+        )
+        timer.mark("time series", pop.tables)
+
+    if state["archive"] is not None:
+        # Drawn after the fs, so that archiving does
+        # not change the results of a replicate.
+        state["archive"].store(session.ts, session.sample_nodes(nsam), seed)
+        timer.mark("archive", pop.tables)
+
+    return (
+        mean_fst,
+        deme_zero_fs,
+        deme_one_fs,
+        fs.mean(axis=0),
+        extra,
+        timer.phases,
+        testutils.memory.peak_rss_mb(),
+    )
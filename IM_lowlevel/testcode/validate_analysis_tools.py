@@ -0,0 +1,119 @@
+"""
+Check the statistics in testutils.analysis_tools
+against moments and tskit.
+
+Exits with an error if any value differs by more
+than floating-point tolerance.
+"""
+
+import argparse
+import sys
+
+import moments
+import msprime
+import numpy as np
+
+import testutils.analysis_tools as at
+
+
+def make_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Validate the vectorized fs statistics", formatter_class=ADHF
+    )
+    parser.add_argument(
+        "--nsam", type=int, default=15, help="Number of diploids sampled per deme"
+    )
+    parser.add_argument(
+        "--nreps", type=int, default=20, help="Number of random spectra to check"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random number seed")
+    return parser
+
+
+def check(name, ours, theirs):
+    ok = np.allclose(ours, theirs, rtol=1e-10, atol=1e-12)
+    print(f"{name}: {'ok' if ok else 'MISMATCH'}")
+    return ok
+
+
+def against_moments(nsam, nreps, rng):
+    """
+    Poisson samples around an IM expectation,
+    compared to moments.Spectrum methods.
+    """
+    n = 2 * nsam
+    expected = 1000.0 * moments.Demographics2D.split_mig((2.0, 3.0, 0.3, 1.0), (n, n))
+    jfs = rng.poisson(np.maximum(expected.data, 0.0), (nreps, n + 1, n + 1))
+    jfs = jfs.astype(np.float64)
+    spectra = [moments.Spectrum(i) for i in jfs]
+
+    m0, m1 = at.marginalize(jfs)
+    ok = check("marginal fs, deme 0", m0, [s.marginalize([1]).data for s in spectra])
+    ok &= check("marginal fs, deme 1", m1, [s.marginalize([0]).data for s in spectra])
+    ok &= check("Weir and Cockerham Fst", at.fst(jfs), [s.Fst() for s in spectra])
+    marginals = [[s.marginalize([1]), s.marginalize([0])] for s in spectra]
+    ok &= check("pi", at.pi(jfs), [[m.pi() for m in i] for i in marginals])
+    ok &= check(
+        "segregating sites",
+        at.segregating_sites(jfs),
+        [[m.S() for m in i] for i in marginals],
+    )
+    ok &= check(
+        "Tajima's D", at.tajimas_d(jfs), [[m.Tajima_D() for m in i] for i in marginals]
+    )
+    return ok
+
+
+def against_tskit(nsam, nreps, seed):
+    """
+    Spectra of msprime simulations, compared
+    to tskit's site statistics.
+    """
+    demography = msprime.Demography()
+    demography.add_population(name="A", initial_size=1000)
+    demography.add_population(name="B", initial_size=1000)
+    demography.add_population(name="C", initial_size=1000)
+    demography.add_population_split(time=500, derived=["A", "B"], ancestral="C")
+    jfs, divergence, diversity = [], [], []
+    for i in range(nreps):
+        ts = msprime.sim_ancestry(
+            {"A": nsam, "B": nsam},
+            demography=demography,
+            sequence_length=1e5,
+            recombination_rate=1e-8,
+            random_seed=seed + i,
+        )
+        # Infinite sites, so that the AFS and tskit agree
+        ts = msprime.sim_mutations(
+            ts, rate=1e-8, discrete_genome=False, random_seed=seed + i
+        )
+        sample_sets = [ts.samples(population=p) for p in (0, 1)]
+        jfs.append(
+            ts.allele_frequency_spectrum(
+                sample_sets, polarised=True, span_normalise=False
+            )
+        )
+        divergence.append(ts.divergence(sample_sets, span_normalise=False))
+        diversity.append(ts.diversity(sample_sets, span_normalise=False))
+    jfs = np.array(jfs)
+    divergence = np.array(divergence)
+    diversity = np.array(diversity)
+
+    ok = check("dxy", at.dxy(jfs), divergence)
+    ok &= check("pi (tskit)", at.pi(jfs), diversity)
+    ok &= check(
+        "Hudson Fst", at.hudson_fst(jfs), 1.0 - diversity.mean(axis=1) / divergence
+    )
+    return ok
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+
+    rng = np.random.default_rng(args.seed)
+    ok = against_moments(args.nsam, args.nreps, rng)
+    ok &= against_tskit(args.nsam, args.nreps, args.seed)
+    if not ok:
+        sys.exit(1)
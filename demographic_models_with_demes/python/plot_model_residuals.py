@@ -1,19 +1,34 @@
 import argparse
 import concurrent.futures
+import csv
+import hashlib
 import os
 import subprocess
 import sys
 
 import demes
-import demesdraw
 import fwdpy11
-import matplotlib.gridspec as gridspec
-import matplotlib.pyplot as plt
-import moments
 import numpy as np
 
-RHO = 100.0  # 1e4
-THETA = 10000.0
+import testutils.accumulator
+import testutils.analysis_tools
+import testutils.bootstrap
+import testutils.checkpoint
+import testutils.convergence
+import testutils.memory
+import testutils.moments_cache
+import testutils.projection
+import testutils.scheduling
+import testutils.status
+import testutils.timing
+import testutils.two_deme_IM_argument_parser
+import testutils.worker_state
+import testutils.workers
+from residuals_worker import THETA, compile_model, get_final_demes, runsim
+
+# Worker processes import this script again, but never
+# plot, so matplotlib, moments and demesdraw are imported
+# by the functions that use them.
 
 
 def make_parser():
@@ -29,6 +44,15 @@ def make_parser():
         help="Burnin (integer multiple of ancestral (meta-)population size)",
     )
 
+    parser.add_argument(
+        "--ancestry",
+        type=str,
+        choices=["forward", "msprime"],
+        default="forward",
+        help="Use a forward burn-in or msprime for the ancestral population. "
+        "With msprime, --burnin is ignored.",
+    )
+
     parser.add_argument(
         "--nsam",
         type=int,
@@ -44,10 +68,38 @@ def make_parser():
         "--nreps",
         type=int,
         default=None,
-        help="Number of forward simulation replicates",
+        help="Number of forward simulation replicates.  "
+        "With --target_ci_width, the maximum number of replicates.",
     )
 
-    parser.add_argument("--nthreads", type=int, default=None, help="Number of threads")
+    parser.add_argument(
+        "--nthreads",
+        type=int,
+        default=None,
+        help="Number of threads.  If None, one per CPU.",
+    )
+
+    parser.add_argument(
+        "--nboot",
+        type=int,
+        default=1000,
+        help="Number of bootstrap resamples of the replicates "
+        "for 95%% confidence intervals.  If 0, no intervals are shown.",
+    )
+
+    parser.add_argument(
+        "--project_nsam",
+        type=int,
+        nargs="*",
+        default=[],
+        help="Also write residuals with both spectra projected to each "
+        "of these numbers of diploids per deme, which must be less than --nsam.",
+    )
+
+    testutils.two_deme_IM_argument_parser.add_common_replicate_options(
+        parser, "every bin of the marginal fs of each deme"
+    )
+    testutils.moments_cache.add_moments_cache_options(parser)
 
     return parser
 
@@ -59,75 +111,39 @@ def validate_args(args):
     if args.nreps is None or args.nreps < 1:
         raise ValueError("nreps must be >= 1")
 
-
-def get_final_demes(dg):
-    return [i.name for i in dg.demes if i.end_time == 0]
+    for n in args.project_nsam:
+        if n < 2 or n >= args.nsam:
+            raise ValueError(f"project_nsam must be from 2 to {args.nsam - 1}")
 
 
 def integrate_fs(args):
-    dg = demes.load(args.yaml)
+    import moments
 
-    final_demes = get_final_demes(dg)
-
-    return moments.Spectrum.from_demes(
-        dg, final_demes, [2 * args.nsam] * len(final_demes)
-    )
-
-
-def runsim(args, simseed, npseed):
     dg = demes.load(args.yaml)
 
     final_demes = get_final_demes(dg)
-
-    demog = fwdpy11.discrete_demography.from_demes(dg, burnin=args.burnin)
-
-    final_deme_ids = sorted(
-        [
-            i
-            for i in demog.metadata["deme_labels"]
-            if demog.metadata["deme_labels"][i] in final_demes
-        ]
-    )
-
-    initial_sizes = [
-        demog.metadata["initial_sizes"][i]
-        for i in sorted(demog.metadata["initial_sizes"].keys())
-    ]
-    recrate = RHO / (4.0 * initial_sizes[0])
-
-    pdict = {
-        "nregions": [],
-        "sregions": [],
-        "recregions": [fwdpy11.PoissonInterval(0, 1, recrate)],
-        "gvalue": fwdpy11.Multiplicative(2.0),
-        "rates": (0.0, 0.0, None),
-        "simlen": demog.metadata["total_simulation_length"],
-        "demography": demog,
+    sample_sizes = [2 * args.nsam] * len(final_demes)
+
+    cache = testutils.moments_cache.make_moments_cache(args)
+    parameters = {
+        "model": "from_demes",
+        "graph": dg.asdict(),
+        "sampled_demes": final_demes,
+        "sample_sizes": sample_sizes,
+        "gamma": 0.0,
+        "h": 0.5,
     }
-    params = fwdpy11.ModelParams(**pdict)
-    pop = fwdpy11.DiploidPopulation(initial_sizes, 1.0)
-
-    # FIXME: need seed as input argument to this fxn
-    rng = fwdpy11.GSLrng(simseed)
-    np.random.seed(npseed)
-
-    fwdpy11.evolvets(rng, pop, params, 100)
-
-    nmuts = fwdpy11.infinite_sites(rng, pop, THETA / (4.0 * initial_sizes[0]))
-
-    md = np.array(pop.diploid_metadata, copy=False)
-    sample_nodes = []
-    for i in final_deme_ids:
-        w = np.where(md["deme"] == i)
-        s = np.random.choice(w[0], args.nsam, replace=False)
-        sample_nodes.append(md["nodes"][s].flatten())
 
-    fs = pop.tables.fs(sample_nodes)
+    return cache.spectrum(
+        parameters,
+        lambda: moments.Spectrum.from_demes(dg, final_demes, sample_sizes),
+    )
 
-    return fs
 
+def make_plot(sim_fs, integrated_fs, args, initial_seed, nreps):
+    import matplotlib.pyplot as plt
+    import moments
 
-def make_plot(sim_fs, integrated_fs, args, initial_seed):
     ndemes = len(integrated_fs.shape)
 
     outfile = os.path.basename(args.yaml).replace(".yml", "_residuals.png")
@@ -135,7 +151,7 @@ def make_plot(sim_fs, integrated_fs, args, initial_seed):
     fig = plt.Figure()
 
     if ndemes == 2:
-        moments_sim_fs = moments.Spectrum(sim_fs.todense())
+        moments_sim_fs = moments.Spectrum(sim_fs)
         moments.Plotting.plot_2d_comp_Poisson(
             integrated_fs,
             moments_sim_fs,
@@ -147,7 +163,7 @@ def make_plot(sim_fs, integrated_fs, args, initial_seed):
         # simfs = os.path.basename(args.yaml).replace("yml", "integrated_fs")
         # integrated_fs.to_file(simfs)
     elif ndemes == 1:
-        moments_sim_fs = moments.Spectrum(sim_fs.data[:-1])
+        moments_sim_fs = moments.Spectrum(sim_fs[:-1])
         moments.Plotting.plot_1d_comp_Poisson(
             integrated_fs[:-1],
             moments_sim_fs,
@@ -159,15 +175,198 @@ def make_plot(sim_fs, integrated_fs, args, initial_seed):
         # simfs = os.path.basename(args.yaml).replace("yml", "integrated_fs")
         # integrated_fs.to_file(simfs)
     else:
-        raise NotImplementedError(f"Plotting not implemented for {ndemes} demes.")
+        plot_marginal_residuals(
+            moments.Spectrum(sim_fs),
+            integrated_fs,
+            get_final_demes(demes.load(args.yaml)),
+        )
 
-    plt.gcf().suptitle(f"No. reps = {args.nreps}, seed = {initial_seed}")
+    title = f"No. reps = {nreps}, seed = {initial_seed}"
+    if args.ancestry == "msprime":
+        title += ", msprime ancestry"
+    if args.stat_mode == "branch":
+        title += ", branch-mode fs"
+    if args.target_ci_width is not None:
+        title += f"\nStopped at relative CI width {args.target_ci_width}"
+        title += f" or {args.nreps} reps"
+    plt.gcf().suptitle(title)
     plt.gcf().tight_layout()
     plt.savefig(outfile)
     return outfile
 
 
+def plot_marginal_residuals(sim_fs, integrated_fs, names):
+    """
+    For more than two demes, compare the marginal fs of
+    each deme, with their Poisson residuals below.
+    """
+    import matplotlib.pyplot as plt
+    import moments
+
+    ndemes = len(integrated_fs.shape)
+    fig = plt.gcf()
+    fig.set_size_inches(4 * ndemes, 6)
+    for i, name in enumerate(names):
+        over = [j for j in range(ndemes) if j != i]
+        model = integrated_fs.marginalize(over)
+        data = sim_fs.marginalize(over)
+        resid = moments.Inference.linear_Poisson_residual(model, data)
+        x = np.arange(1, len(model) - 1)
+
+        ax = fig.add_subplot(2, ndemes, i + 1)
+        ax.semilogy(x, data[1:-1], "bo", label="fwdpy11")
+        ax.semilogy(x, model[1:-1], "go", label="moments")
+        ax.set_title(name)
+        ax.legend()
+
+        ax = fig.add_subplot(2, ndemes, ndemes + i + 1)
+        ax.plot(x, resid[1:-1], "ro")
+        ax.axhline(0, color="k")
+        ax.set_xlabel("Derived frequency")
+        ax.set_ylabel("Residual")
+
+
+def write_residuals(sim_fs, integrated_fs, args):
+    """
+    Poisson residuals of the full joint fs, with
+    masked entries set to nan.
+    """
+    import moments
+
+    resid = moments.Inference.linear_Poisson_residual(
+        integrated_fs, moments.Spectrum(sim_fs)
+    )
+    outfile = os.path.basename(args.yaml).replace(".yml", "_residuals.npy")
+    np.save(outfile, np.ma.filled(resid, np.nan))
+    return outfile
+
+
+def write_projected_residuals(sim_fs, integrated_fs, nreps, args):
+    """
+    For each of args.project_nsam, the Poisson residuals
+    of the joint fs with both spectra projected to that
+    many diploids per deme, as from write_residuals.
+
+    A summary of each size is written to one CSV file.
+    Its residuals are multiplied by sqrt(nreps), so that
+    at the sampled size their root mean square is about 1
+    when the simulations match moments.  Projected spectra
+    average over subsamples, so they vary less and their
+    root mean square is smaller.
+    """
+    import moments
+
+    stem = os.path.basename(args.yaml).replace(".yml", "")
+    ndemes = len(integrated_fs.shape)
+    rows = []
+    for n in sorted(set(args.project_nsam)) + [args.nsam]:
+        sizes = [2 * n] * ndemes
+        model = integrated_fs.project(sizes)
+        data = moments.Spectrum(
+            testutils.projection.project(sim_fs[np.newaxis], sizes)[0]
+        )
+        resid = moments.Inference.linear_Poisson_residual(model, data)
+        if n < args.nsam:
+            np.save(f"{stem}_residuals_n{n}.npy", np.ma.filled(resid, np.nan))
+        z = np.sqrt(nreps) * np.ma.compressed(resid)
+        rows.append(
+            {
+                "nsam": n,
+                "nreps": nreps,
+                "rms_z": np.sqrt(np.mean(z**2)),
+                "max_abs_z": np.max(np.abs(z)),
+            }
+        )
+    outfile = f"{stem}_projections.csv"
+    with open(outfile, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    return outfile
+
+
+def marginal_statistics(sim_fs):
+    """
+    The statistics of one replicate used by the
+    stopping rule: the marginal fs of each deme,
+    without its monomorphic bins.
+
+    Most bins of a joint fs with more than one deme
+    have too few expected counts for their relative
+    confidence intervals to ever become narrow.
+    """
+    marginals = testutils.analysis_tools.marginalize(sim_fs[np.newaxis])
+    return {f"deme{i}": m[0, 1:-1] for i, m in enumerate(marginals)}
+
+
+def marginal_stacks(fs, rows, chunk=64):
+    """
+    Per-replicate marginal fs of each deme,
+    from the joint fs of the given rows.
+
+    fs may be memory-mapped.  It is read chunk
+    replicates at a time, so that only the
+    marginals are held in memory.
+
+    As with moments.Spectrum.marginalize, the
+    corners of the joint fs are not counted.
+    """
+    rows = np.sort(rows)
+    marginals = [np.empty((len(rows), n)) for n in fs.shape[1:]]
+    for start in range(0, len(rows), chunk):
+        stack = np.array(fs[rows[start : start + chunk]])
+        for m, c in zip(marginals, testutils.analysis_tools.marginalize(stack)):
+            m[start : start + len(stack)] = c
+    return marginals
+
+
+def make_bootstrap_plot(fs, rows, integrated_fs, args):
+    """
+    Marginal fs of each deme, with bootstrap
+    95% confidence intervals of the simulated means.
+
+    fs - per-replicate fs, of shape (nreps, ...),
+         which may be memory-mapped
+    rows - the replicates of fs to use
+    """
+    import matplotlib.pyplot as plt
+
+    ndemes = len(integrated_fs.shape)
+    names = get_final_demes(demes.load(args.yaml))
+    if ndemes == 1:
+        moments_fs = [integrated_fs]
+    else:
+        moments_fs = [
+            integrated_fs.marginalize([j for j in range(ndemes) if j != i])
+            for i in range(ndemes)
+        ]
+
+    outfile = os.path.basename(args.yaml).replace(".yml", "_bootstrap.png")
+
+    rng = np.random.default_rng(args.seed)
+    fig, axes = plt.subplots(1, ndemes, figsize=(4 * ndemes, 4), squeeze=False)
+    for name, sim, mfs, ax in zip(
+        names, marginal_stacks(fs, rows), moments_fs, axes[0]
+    ):
+        sim = sim[:, 1:-1]
+        x = np.arange(1, sim.shape[1] + 1)
+        lower, upper = testutils.bootstrap.confidence_band(sim, args.nboot, rng=rng)
+        ax.fill_between(x, lower, upper, color="b", alpha=0.3, label="fwdpy11 95% CI")
+        ax.plot(x, sim.mean(axis=0), "bo", label="fwdpy11")
+        ax.plot(x, mfs.data[1:-1], "go", label="moments")
+        ax.set_xlabel("Derived frequency")
+        ax.set_title(name)
+        ax.legend()
+    fig.tight_layout()
+    fig.savefig(outfile)
+    plt.close(fig)
+    return outfile
+
+
 def draw_model(args):
+    import demesdraw
+    import matplotlib.pyplot as plt
+
     dg = demes.load(args.yaml)
     outfile = os.path.basename(args.yaml).replace(".yml", "_draw.png")
     _ = demesdraw.tubes(dg)
@@ -175,30 +374,47 @@ def draw_model(args):
     return outfile
 
 
-def update_fs(current_fs, new_fs, ndemes):
-    if current_fs is None:
-        if ndemes == 1:
-            return np.array(new_fs.data, dtype=np.float64)
-        elif ndemes == 2:
-            return new_fs  # .astype(np.float64)
-
-    if ndemes == 1:
-        return current_fs + np.array(new_fs.data, dtype=np.float64)
-    elif ndemes == 2:
-        return current_fs + new_fs  # .astype(np.float64)
-
-
 if __name__ == "__main__":
     parser = make_parser()
 
     args = parser.parse_args(sys.argv[1:])
 
     validate_args(args)
+    args.nthreads = testutils.workers.resolve_nworkers(args.nthreads)
 
-    integrated_fs = integrate_fs(args)
-    ndemes = len(integrated_fs.shape)
+    # The moments spectrum is integrated by its own process
+    # while the replicates run, and is only needed to plot.
+    moments_executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=1, mp_context=testutils.workers.pool_context()
+    )
+    integration = moments_executor.submit(integrate_fs, args)
+    ndemes = len(get_final_demes(demes.load(args.yaml)))
+    fs_shape = (2 * args.nsam + 1,) * ndemes
+
+    initial_seed = args.seed
+    if initial_seed is None:
+        initial_seed = np.random.randint(0, np.iinfo(np.uint32).max, 1)[0]
+
+    # See ReplicateLog for what belongs in the header.
+    with open(args.yaml, "rb") as f:
+        header = {
+            "yaml": hashlib.sha256(f.read()).hexdigest(),
+            "fwdpy11": fwdpy11.__version__,
+            "burnin": args.burnin,
+            "ancestry": args.ancestry,
+            "stat_mode": args.stat_mode,
+            "nsam": args.nsam,
+            "archive": args.archive,
+            "seed": args.seed,
+        }
+    log = testutils.checkpoint.ReplicateLog(
+        os.path.basename(args.yaml).replace(".yml", "_checkpoint.npy"),
+        header,
+        initial_seed,
+        np.dtype([("seed", np.uint64), ("fs", np.float64, fs_shape)]),
+    )
+    initial_seed = log.initial_seed
 
-    initial_seed = np.random.randint(0, np.iinfo(np.uint32).max, 1)[0]
     np.random.seed(initial_seed)
     simseeds = []
     npseeds = []
@@ -213,17 +429,88 @@ if __name__ == "__main__":
             s = np.random.randint(0, np.iinfo(np.uint32).max, 1)
         npseeds.append(s)
 
-    mean_fs = None
-    with concurrent.futures.ProcessPoolExecutor(max_workers=args.nthreads) as e:
-        futures = {e.submit(runsim, args, i, j) for i, j in zip(simseeds, npseeds)}
-        for f in concurrent.futures.as_completed(futures):
-            sim_fs = f.result()
-            mean_fs = update_fs(mean_fs, sim_fs, ndemes)
+    monitor = testutils.convergence.ConvergenceMonitor(
+        args.target_ci_width, args.min_reps, args.nreps
+    )
+
+    sum_fs = testutils.accumulator.SpectrumSum(fs_shape)
+    # Seeds of the replicates in sum_fs
+    used = []
+    records = log.records()
+    for i in simseeds:
+        if monitor.done():
+            break
+        if int(i[0]) in log.completed:
+            sim_fs = records[log.completed[int(i[0])]]["fs"]
+            sum_fs.add(sim_fs)
+            monitor.update(**marginal_statistics(sim_fs))
+            used.append(int(i[0]))
+
+    # Resumed runs keep their timings, see TimingLog.
+    timings = testutils.timing.TimingLog(
+        os.path.basename(args.yaml).replace(".yml", "_timings.jsonl"),
+        len(log.completed) > 0,
+    )
+
+    budget = testutils.memory.MemoryBudget(args.memory_budget, args.nthreads)
 
-    mean_fs = mean_fs.astype(np.float64) / float(args.nreps)
-    residfile = make_plot(mean_fs, integrated_fs * THETA, args, initial_seed)
-    drawfile = draw_model(args)
+    pending = [
+        (i, j) for i, j in zip(simseeds, npseeds) if int(i[0]) not in log.completed
+    ]
+    status = testutils.status.StatusWriter(
+        os.path.basename(args.yaml).replace(".yml", "_status.json"),
+        len(pending),
+        args.nthreads,
+    )
+
+    with moments_executor, log, timings, status, concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.nthreads,
+        mp_context=testutils.workers.pool_context(),
+        initializer=testutils.worker_state.initialize,
+        initargs=(compile_model, args),
+    ) as e:
+
+        def submit(seeds):
+            return e.submit(testutils.status.run_timed, runsim, *seeds)
+
+        for seeds, f in testutils.scheduling.as_completed_bounded(
+            submit,
+            pending,
+            budget.max_in_flight,
+            monitor.done,
+        ):
+            try:
+                pid, seconds, (sim_fs, phases, rss) = f.result()
+            except Exception:
+                status.fail()
+                raise
+            status.add(pid, seconds)
+            budget.update(rss)
+            log.append(seeds[0][0], fs=sim_fs)
+            timings.append(seeds[0][0], phases)
+            sum_fs.add(sim_fs)
+            monitor.update(**marginal_statistics(sim_fs))
+            used.append(int(seeds[0][0]))
+            # Fail early, rather than after the last
+            # replicate, if moments could not integrate.
+            if integration.done():
+                integration.result()
+
+        integrated_fs = integration.result()
+
+    mean_fs = sum_fs.mean()
+    write_residuals(mean_fs, integrated_fs * THETA, args)
+    if len(args.project_nsam) > 0:
+        write_projected_residuals(mean_fs, integrated_fs * THETA, monitor.n, args)
+    residfile = make_plot(mean_fs, integrated_fs * THETA, args, initial_seed, monitor.n)
+    pngfiles = [residfile]
+    if args.nboot > 0:
+        rows = [log.completed[seed] for seed in used]
+        pngfiles.append(
+            make_bootstrap_plot(log.records()["fs"], rows, integrated_fs * THETA, args)
+        )
+    pngfiles.append(draw_model(args))
     subprocess.call(
-        f"convert {residfile} {drawfile} +append {os.path.basename(args.yaml).replace('.yml','.png')}",
+        f"convert {' '.join(pngfiles)} +append {os.path.basename(args.yaml).replace('.yml','.png')}",
         shell=True,
     )
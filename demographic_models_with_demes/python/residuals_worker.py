@@ -0,0 +1,159 @@
+"""
+The code run by worker processes of plot_model_residuals.py.
+
+Workers import this module, and not the plotting code, so
+keep its imports to what a replicate needs.
+"""
+
+import os
+
+import demes
+import fwdpy11
+import numpy as np
+
+import testutils.ancestry
+import testutils.archive
+import testutils.memory
+import testutils.simplification
+import testutils.timing
+import testutils.worker_state
+
+RHO = 100.0  # 1e4
+THETA = 10000.0
+
+
+def get_final_demes(dg):
+    return [i.name for i in dg.demes if i.end_time == 0]
+
+
+def compile_model(args):
+    """
+    Everything about a replicate that does not depend on
+    its seeds.  Run once per worker process.
+    """
+    dg = demes.load(args.yaml)
+
+    final_demes = get_final_demes(dg)
+
+    if args.ancestry == "msprime":
+        demog = fwdpy11.discrete_demography.from_demes(
+            testutils.ancestry.start_at_first_event(dg), burnin=0
+        )
+    else:
+        demog = fwdpy11.discrete_demography.from_demes(dg, burnin=args.burnin)
+
+    final_deme_ids = sorted(
+        [
+            i
+            for i in demog.metadata["deme_labels"]
+            if demog.metadata["deme_labels"][i] in final_demes
+        ]
+    )
+
+    initial_sizes = [
+        demog.metadata["initial_sizes"][i]
+        for i in sorted(demog.metadata["initial_sizes"].keys())
+    ]
+    recrate = RHO / (4.0 * initial_sizes[0])
+
+    pdict = {
+        "nregions": [],
+        "sregions": [],
+        "recregions": [fwdpy11.PoissonInterval(0, 1, recrate)],
+        "gvalue": fwdpy11.Multiplicative(2.0),
+        "rates": (0.0, 0.0, None),
+        "simlen": demog.metadata["total_simulation_length"],
+        "demography": demog,
+    }
+
+    archive = None
+    if args.archive is True:
+        archive = testutils.archive.TreeArchive(
+            os.path.basename(args.yaml).replace(".yml", "_trees")
+        )
+
+    # Every replicate starts at generation 0, where
+    # evolvets resets the state of the demography,
+    # so the same ModelParams serves them all.
+    return {
+        "args": args,
+        "params": fwdpy11.ModelParams(**pdict),
+        "final_deme_ids": final_deme_ids,
+        "initial_sizes": initial_sizes,
+        "burnin_end": testutils.ancestry.burnin_end(demog.metadata["burnin_time"]),
+        "simplification_interval": testutils.simplification.read_interval(args.yaml),
+        "archive": archive,
+    }
+
+
+def new_population(model, simseed):
+    args = model["args"]
+    initial_sizes = model["initial_sizes"]
+    if args.ancestry == "msprime":
+        return testutils.ancestry.msprime_population(
+            initial_sizes[0], RHO, 1.0, simseed
+        )
+    return fwdpy11.DiploidPopulation(initial_sizes, 1.0)
+
+
+def runsim(simseed, npseed):
+    model = testutils.worker_state.get()
+    args = model["args"]
+    params = model["params"]
+    initial_sizes = model["initial_sizes"]
+
+    timer = testutils.timing.PhaseTimer()
+    pop = new_population(model, simseed)
+    timer.mark("ancestry", pop.tables)
+
+    # FIXME: need seed as input argument to this fxn
+    rng = fwdpy11.GSLrng(simseed)
+    np.random.seed(npseed)
+
+    recorder = None
+    if pop.generation < model["burnin_end"]:
+        recorder = timer.recorder("burnin", model["burnin_end"])
+    else:
+        timer.mark("burnin", pop.tables)
+    fwdpy11.evolvets(rng, pop, params, model["simplification_interval"], recorder)
+    timer.mark("post-burnin", pop.tables)
+
+    mu = THETA / (4.0 * initial_sizes[0])
+    if args.stat_mode == "site":
+        fwdpy11.infinite_sites(rng, pop, mu)
+        timer.mark("mutations", pop.tables)
+
+    md = np.array(pop.diploid_metadata, copy=False)
+    sample_nodes = []
+    for i in model["final_deme_ids"]:
+        w = np.where(md["deme"] == i)
+        s = np.random.choice(w[0], args.nsam, replace=False)
+        sample_nodes.append(md["nodes"][s].flatten())
+
+    if args.stat_mode == "branch":
+        # Expected number of mutations in each bin,
+        # given the genealogies of the sample.
+        ts = pop.dump_tables_to_tskit()
+        timer.mark("tskit", pop.tables)
+        fs = ts.allele_frequency_spectrum(sample_nodes, mode="branch", polarised=True)
+        fs = mu * fs
+    else:
+        fs = dense_fs(pop.tables.fs(sample_nodes), len(sample_nodes))
+    timer.mark("fs", pop.tables)
+
+    if model["archive"] is not None:
+        if args.stat_mode == "site":
+            ts = pop.dump_tables_to_tskit()
+        model["archive"].store(ts, sample_nodes, simseed[0])
+        timer.mark("archive", pop.tables)
+
+    return fs, timer.phases, testutils.memory.peak_rss_mb()
+
+
+def dense_fs(fs, ndemes):
+    """
+    Convert the output of pop.tables.fs to a dense array.
+    """
+    if ndemes == 1:
+        return np.array(fs.data, dtype=np.float64)
+    return np.array(fs.todense(), dtype=np.float64)
@@ -0,0 +1,97 @@
+import argparse
+import sys
+import time
+
+import fwdpy11
+import numpy as np
+
+import testutils.memory
+import testutils.simplification
+import testutils.worker_state
+from residuals_worker import compile_model, new_population
+
+
+def make_parser():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--yaml", type=str, default=None, help="YAML file containing demographic model"
+    )
+    parser.add_argument(
+        "--burnin",
+        type=int,
+        default=10,
+        help="Burnin (integer multiple of ancestral (meta-)population size)",
+    )
+    parser.add_argument(
+        "--ancestry",
+        type=str,
+        choices=["forward", "msprime"],
+        default="forward",
+        help="Use a forward burn-in or msprime for the ancestral population.",
+    )
+    parser.add_argument(
+        "--intervals",
+        type=int,
+        nargs="+",
+        default=[10, 25, 50, 100, 250, 500, 1000],
+        help="Simplification intervals to try",
+    )
+    parser.add_argument(
+        "--npilot", type=int, default=2, help="Number of replicates per interval"
+    )
+    parser.add_argument(
+        "--max_rss_mb",
+        type=float,
+        default=None,
+        help="Ignore intervals whose replicates used more memory than this",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random number seed")
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Print the results without writing the metadata file",
+    )
+    # compile_model reads this option of plot_model_residuals.py
+    parser.set_defaults(archive=False)
+
+    return parser
+
+
+def trial(interval, seed):
+    model = testutils.worker_state.get()
+    pop = new_population(model, seed)
+    rng = fwdpy11.GSLrng(seed)
+    start = time.monotonic()
+    fwdpy11.evolvets(rng, pop, model["params"], interval)
+    return time.monotonic() - start, testutils.memory.peak_rss_mb()
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.yaml is None:
+        raise ValueError("No YAML file specified")
+
+    np.random.seed(args.seed)
+    seeds = np.random.randint(0, np.iinfo(np.uint32).max, args.npilot)
+
+    results = testutils.simplification.benchmark(
+        compile_model, (args,), trial, args.intervals, seeds
+    )
+    testutils.simplification.print_results(results)
+    best = testutils.simplification.best_interval(results, args.max_rss_mb)
+    print(f"Best simplification interval: {best}")
+
+    if args.dry_run is False:
+        testutils.simplification.write_interval(
+            args.yaml,
+            best,
+            {
+                "burnin": args.burnin,
+                "ancestry": args.ancestry,
+                "fwdpy11": fwdpy11.__version__,
+                "trials": results,
+            },
+        )
@@ -45,7 +45,11 @@ if __name__ == "__main__":
             "build",
             "--build-arg",
             f"tag={tag}",
-            ".",
+            # Build from the repository root, so that the
+            # image can install the shared testutils package.
+            "-f",
+            "Dockerfile",
+            "..",
             "-t",
             f"fwdpy11_statistical_tests:{tag}",
         ],
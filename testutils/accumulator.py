@@ -0,0 +1,25 @@
+import numpy as np
+
+
+class SpectrumSum(object):
+    """
+    Sum of dense fs of any number of demes,
+    accumulated in place in a preallocated array.
+
+    shape - the shape of each fs, such as the shape
+            of the moments expectation
+    """
+
+    def __init__(self, shape):
+        self.total = np.zeros(shape, dtype=np.float64)
+        self.n = 0
+
+    def add(self, fs):
+        fs = np.asarray(fs)
+        if fs.shape != self.total.shape:
+            raise ValueError(f"fs has shape {fs.shape}, expected {self.total.shape}")
+        np.add(self.total, fs, out=self.total)
+        self.n += 1
+
+    def mean(self):
+        return self.total / float(self.n)
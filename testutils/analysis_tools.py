@@ -0,0 +1,397 @@
+import numpy as np
+import tskit
+
+
+class SamplingSession(object):
+    """
+    Take many random samples from a single population.
+
+    The per-deme individual indexes are found once,
+    and the tables are converted to tskit at most once,
+    so that each subsample only costs the AFS calculation.
+
+    pop - fwdpy11.DiploidPopulation
+    rng - a numpy.random.Generator to draw the samples
+          with.  If None, the global numpy.random state
+          is used.
+    """
+
+    def __init__(self, pop, rng=None):
+        if rng is None:
+            rng = np.random
+        self.rng = rng
+        md = np.array(pop.diploid_metadata, copy=False)
+        self.pop = pop
+        self.nodes = np.array(md["nodes"])
+        self.demes = np.unique(md["deme"])
+        self.deme_individuals = [np.where(md["deme"] == i)[0] for i in self.demes]
+        self._ts = None
+
+    @property
+    def ts(self):
+        """
+        The tskit.TreeSequence, created on first access.
+        """
+        if self._ts is None:
+            self._ts = self.pop.dump_tables_to_tskit()
+        return self._ts
+
+    def sample_nodes(self, nsam):
+        """
+        Sample nsam diploids without replacement from each deme.
+
+        Returns a list of node arrays, one per deme.
+        """
+        samples = []
+        for w in self.deme_individuals:
+            r = self.rng.choice(w, nsam, replace=False)
+            samples.append(self.nodes[r].flatten())
+        return samples
+
+    def subsample_nodes(self, nsam, nsubsamples):
+        """
+        Take nsubsamples independent samples of nsam
+        diploids from each deme.
+
+        Returns a list with one (nsubsamples, 2*nsam)
+        node array per deme.
+        """
+        samples = []
+        for w in self.deme_individuals:
+            # Random keys sorted per row give nsubsamples
+            # draws without replacement in one call.
+            keys = self.rng.random((nsubsamples, len(w)))
+            r = w[np.argsort(keys, axis=1)[:, :nsam]]
+            samples.append(self.nodes[r].reshape(nsubsamples, 2 * nsam))
+        return samples
+
+    def ancient_sample_nodes(self):
+        """
+        The nodes of the individuals preserved as ancient
+        samples during the simulation, grouped by the
+        generation in which they were preserved.
+
+        Returns a list of (generation, sample_sets), in
+        order of generation, where sample_sets has one
+        (1, 2*n) node array per deme, as from subsample_nodes.
+        """
+        timepoints = []
+        for generation, _, md in self.pop.sample_timepoints(include_alive=False):
+            sample_sets = [
+                md["nodes"][md["deme"] == i].reshape(1, -1) for i in self.demes
+            ]
+            timepoints.append((int(generation), sample_sets))
+        return timepoints
+
+    def tskit_fs(self, nsam, mode="site", joint=True):
+        """
+        nsam - sample size (diploids) per deme
+        mode - the tree seq stat mode
+        joint - Joint FS?
+        """
+        samples = self.sample_nodes(nsam)
+
+        if joint is True:
+            return self.ts.allele_frequency_spectrum(samples, mode=mode, polarised=True)
+
+        afs = dict()
+        for i, j in zip(self.demes, samples):
+            afs[i] = self.ts.allele_frequency_spectrum([j], mode=mode, polarised=True)
+        return afs
+
+    def fs(self, nsam, marginalize=False):
+        """
+        Same as tskit_fs, but using fwdpy11's
+        own tables.  No conversion to tskit happens.
+        """
+        samples = self.sample_nodes(nsam)
+        return self.pop.tables.fs(samples, marginalize=marginalize)
+
+
+def joint_fs_batch(session, sample_sets):
+    """
+    Joint fs for many subsamples at once.
+
+    session - a SamplingSession
+    sample_sets - as returned by SamplingSession.subsample_nodes
+
+    Returns an array of shape (nsubsamples, n0 + 1, n1 + 1, ...),
+    where ni is the number of sampled nodes from deme i.
+    Each entry of the first axis is the same as
+    SamplingSession.tskit_fs for that subsample.
+
+    tskit finds each one from the trees, so that no
+    genotype matrix of the samples is built.
+    """
+    nsubsamples = sample_sets[0].shape[0]
+    jfs = [
+        session.ts.allele_frequency_spectrum(
+            [s[i] for s in sample_sets],
+            mode="site",
+            polarised=True,
+            span_normalise=False,
+        )
+        for i in range(nsubsamples)
+    ]
+    return np.array(jfs, dtype=np.float64)
+
+
+def branch_fs_batch(session, sample_sets, mu):
+    """
+    Expected joint fs for many subsamples, given
+    the genealogy of each one.
+
+    session - a SamplingSession
+    sample_sets - as returned by SamplingSession.subsample_nodes
+    mu - neutral mutation rate per gamete per generation,
+         as passed to fwdpy11.infinite_sites
+
+    The branch-mode AFS is the total length of the
+    branches subtending each number of samples,
+    averaged along the genome.  Multiplied by mu,
+    it is the expected number of infinite-sites
+    mutations in each bin, so there is no need
+    to place mutations.  The output has the same
+    shape as joint_fs_batch.
+    """
+    nsubsamples = sample_sets[0].shape[0]
+    jfs = [
+        session.ts.allele_frequency_spectrum(
+            [s[i] for s in sample_sets], mode="branch", polarised=True
+        )
+        for i in range(nsubsamples)
+    ]
+    return mu * np.array(jfs, dtype=np.float64)
+
+
+def marginalize(jfs):
+    """
+    Marginal fs of each deme from a stack of
+    joint fs, as returned by joint_fs_batch.
+
+    As with moments.Spectrum.marginalize, the
+    corners of the joint fs are not counted.
+
+    Returns a list with one (nsubsamples, ni + 1)
+    array per deme.
+    """
+    jfs = _mask_corners(jfs)
+    axes = tuple(range(1, jfs.ndim))
+    return [jfs.sum(axis=tuple(j for j in axes if j != i)) for i in axes]
+
+
+def fst(jfs):
+    """
+    Fst for each joint fs in a stack of
+    joint fs, as returned by joint_fs_batch.
+
+    This is the Weir and Cockerham estimator used
+    by moments.Spectrum.Fst, vectorized over the
+    first axis.
+    """
+    a, d = _fst_weights(jfs.shape[1:])
+    jfs = _mask_corners(jfs)
+    axes = tuple(range(1, jfs.ndim))
+    asum = (jfs * a).sum(axis=axes)
+    dsum = (jfs * d).sum(axis=axes)
+    return asum / (asum + dsum)
+
+
+def pi(jfs):
+    """
+    Nucleotide diversity of each deme, from a stack
+    of joint fs.  The same as moments.Spectrum.pi
+    of each marginal fs.
+
+    Returns an array of shape (nsubsamples, ndemes).
+    """
+    out = []
+    for m in marginalize(jfs):
+        n = m.shape[1] - 1
+        p = np.arange(n + 1) / n
+        out.append(n / (n - 1.0) * 2 * (m * p * (1 - p)).sum(axis=1))
+    return np.array(out).T
+
+
+def segregating_sites(jfs):
+    """
+    Number of sites that are polymorphic in each deme.
+    The same as moments.Spectrum.S of each marginal fs.
+
+    Returns an array of shape (nsubsamples, ndemes).
+    """
+    return np.array([m[:, 1:-1].sum(axis=1) for m in marginalize(jfs)]).T
+
+
+def tajimas_d(jfs):
+    """
+    Tajima's D of each deme.  The same as
+    moments.Spectrum.Tajima_D of each marginal fs.
+
+    Returns an array of shape (nsubsamples, ndemes).
+    """
+    S = segregating_sites(jfs)
+    n = np.array(jfs.shape[1:], dtype=np.float64) - 1
+    a1 = np.array([np.sum(1.0 / np.arange(1, i)) for i in n])
+    a2 = np.array([np.sum(1.0 / np.arange(1, i) ** 2) for i in n])
+    b1 = (n + 1) / (3 * (n - 1))
+    b2 = 2 * (n**2 + n + 3) / (9 * n * (n - 1))
+    c1 = b1 - 1.0 / a1
+    c2 = b2 - (n + 2) / (a1 * n) + a2 / a1**2
+    C = np.sqrt((c1 / a1) * S + c2 / (a1**2 + a2) * S * (S - 1))
+    return (pi(jfs) - S / a1) / C
+
+
+def dxy(jfs):
+    """
+    Mean number of differences between one chromosome
+    from each of two demes, from a stack of two-deme
+    joint fs.
+
+    Returns an array of shape (nsubsamples,).
+    """
+    if jfs.ndim != 3:
+        raise ValueError("dxy requires two-deme joint fs")
+    n0, n1 = jfs.shape[1] - 1, jfs.shape[2] - 1
+    i, j = np.indices(jfs.shape[1:])
+    w = (i * (n1 - j) + j * (n0 - i)) / (n0 * n1)
+    return (jfs * w).sum(axis=(1, 2))
+
+
+def hudson_fst(jfs):
+    """
+    Hudson's Fst, 1 - Hw / Hb, from a stack of
+    two-deme joint fs.
+
+    Hw is the mean of the two within-deme values
+    of pi and Hb is dxy, each summed over sites
+    before taking the ratio.  Note that fst
+    (Weir and Cockerham) is what moments reports.
+
+    Returns an array of shape (nsubsamples,).
+    """
+    return 1.0 - pi(jfs).mean(axis=1) / dxy(jfs)
+
+
+# Statistics of a stack of joint fs, by name.  Each one
+# is a function of the joint fs alone, and returns one
+# value per subsample, or one per subsample and deme
+# for those in PER_DEME_STATISTICS.
+STATISTICS = {
+    "fst": fst,
+    "hudson_fst": hudson_fst,
+    "dxy": dxy,
+    "pi": pi,
+    "segregating_sites": segregating_sites,
+    "tajimas_d": tajimas_d,
+}
+
+PER_DEME_STATISTICS = ("pi", "segregating_sites", "tajimas_d")
+
+
+def statistic_shape(name, ndemes):
+    """
+    The shape of one subsample's value of a statistic.
+    """
+    if name in PER_DEME_STATISTICS:
+        return (ndemes,)
+    return ()
+
+
+class StatisticsEngine(object):
+    """
+    A set of statistics of each replicate, from
+    the joint fs of its subsamples.
+
+    Every statistic in STATISTICS is a linear function
+    of the joint fs, or a ratio of such functions.  So
+    tskit finds the joint fs of each subsample once, and
+    each statistic is a few array operations on it,
+    rather than a general stat of its own.
+
+    statistics - names from STATISTICS
+    mode - "site" or "branch"
+    mu - the mutation rate, for branch mode
+    """
+
+    def __init__(self, statistics, mode="site", mu=None):
+        for name in statistics:
+            if name not in STATISTICS:
+                raise ValueError(f"unknown statistic {name}")
+        if mode == "branch" and mu is None:
+            raise ValueError("branch mode requires mu")
+        self.statistics = list(statistics)
+        self.mode = mode
+        self.mu = mu
+
+    def fs(self, session, sample_sets):
+        """
+        The stack of joint fs of the subsamples,
+        as from joint_fs_batch or branch_fs_batch.
+        """
+        if self.mode == "branch":
+            return branch_fs_batch(session, sample_sets, self.mu)
+        return joint_fs_batch(session, sample_sets)
+
+    def compute(self, jfs):
+        """
+        Returns a dict mapping each statistic
+        to its values for each subsample.
+        """
+        return {name: STATISTICS[name](jfs) for name in self.statistics}
+
+    def __call__(self, session, sample_sets):
+        """
+        Returns the stack of joint fs and the
+        dict of statistics.
+        """
+        jfs = self.fs(session, sample_sets)
+        return jfs, self.compute(jfs)
+
+
+def _mask_corners(jfs):
+    jfs = jfs.copy()
+    ndemes = jfs.ndim - 1
+    jfs[(slice(None),) + (0,) * ndemes] = 0.0
+    jfs[(slice(None),) + (-1,) * ndemes] = 0.0
+    return jfs
+
+
+def _fst_weights(shape):
+    """
+    The per-bin terms of Weir and Cockerham (1984),
+    eqn. 10, as calculated by moments.Spectrum.Fst.
+    They only depend on the sample sizes.
+    """
+    r = len(shape)
+    ns = np.array(shape) - 1
+    nbar = np.mean(ns)
+    nsum = np.sum(ns)
+    nc = (nsum - np.sum(ns**2) / nsum) / (r - 1)
+
+    counts_per_pop = np.moveaxis(np.indices(shape), 0, -1)
+    ptwiddle = 1.0 * counts_per_pop / ns
+    pbar = np.sum(ns * ptwiddle, axis=-1) / nsum
+    s2 = np.sum(ns * (ptwiddle - pbar[..., np.newaxis]) ** 2, axis=-1) / (
+        (r - 1) * nbar
+    )
+    a = nbar / nc * (s2 - 1 / (2 * nbar - 1) * (pbar * (1 - pbar) - (r - 1) / r * s2))
+    d = 2 * nbar / (2 * nbar - 1) * (pbar * (1 - pbar) - (r - 1) / r * s2)
+    return a, d
+
+
+def tskit_fs(pop, nsam, mode="site", joint=True):
+    """
+    pop - fwdpy11.DiploidPopulation
+    nsam - sample size (diploids) per deme
+    mode - the tree seq stat mode
+    joint - Joint FS?
+
+    When taking more than one sample from the
+    same pop, use SamplingSession instead.
+    """
+    return SamplingSession(pop).tskit_fs(nsam, mode=mode, joint=joint)
+
+
+def fs(pop, nsam, marginalize=False):
+    return SamplingSession(pop).fs(nsam, marginalize=marginalize)
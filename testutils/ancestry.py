@@ -0,0 +1,81 @@
+import math
+
+import fwdpy11
+
+
+def msprime_population(N, rho, genome_length, seed):
+    """
+    Returns a fwdpy11.DiploidPopulation of N diploids
+    whose ancestry is a coalescent simulation from
+    msprime.  This replaces a forward burn-in of a
+    neutral, constant-size ancestral population.
+
+    N - the population size
+    rho - 4*N*r, where r is the recombination rate
+          per generation over the whole genome
+    genome_length - the genome length
+    seed - random number seed.  Must be < 2**32 - 1.
+    """
+    # Imported here, so that workers of forward-only
+    # runs never load msprime.
+    import msprime
+
+    ts = msprime.sim_ancestry(
+        samples=N,
+        population_size=N,
+        ploidy=2,
+        sequence_length=genome_length,
+        recombination_rate=rho / (4.0 * N) / genome_length,
+        discrete_genome=False,
+        random_seed=int(seed) + 1,
+    )
+    return fwdpy11.DiploidPopulation.create_from_tskit(ts)
+
+
+def burnin_end(first_event):
+    """
+    Returns the last generation of the burn-in of a model
+    whose first demographic event is at generation
+    first_event.
+
+    fwdpy11 increments pop.generation before applying
+    demographic events, so an event at generation t
+    happens in the generation simulated after t - 1,
+    and an event at generation 0 never happens.
+    """
+    return int(first_event) - 1
+
+
+def start_at_first_event(dg):
+    """
+    Returns a copy of the demes.Graph dg that starts one
+    generation before its oldest event.  Simulating the
+    returned graph with burnin=0 starts the forward
+    simulation right at the first demographic event.
+
+    An event at generation 0 never happens (see
+    burnin_end), so we add an epoch boundary to the root
+    deme one generation before the oldest event.  That
+    boundary is at generation 0 and changes nothing.
+
+    The graph must have a single root deme.
+    """
+    import demes
+
+    roots = [i for i in dg.demes if math.isinf(i.start_time)]
+    if len(roots) != 1:
+        raise ValueError("msprime ancestry requires a single root deme")
+
+    times = [i.end_time for i in roots[0].epochs]
+    times.extend(i.start_time for i in dg.demes if i is not roots[0])
+    times.extend(i.start_time for i in dg.migrations if not math.isinf(i.start_time))
+    times.extend(i.end_time for i in dg.migrations)
+    times.extend(i.time for i in dg.pulses)
+    oldest = max(times)
+
+    d = dg.asdict()
+    root = [i for i in d["demes"] if i["name"] == roots[0].name][0]
+    first_epoch = dict(root["epochs"][0])
+    first_epoch["end_time"] = oldest + 1
+    root["epochs"].insert(0, first_epoch)
+    return demes.Builder.fromdict(d).resolve()
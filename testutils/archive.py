@@ -0,0 +1,206 @@
+"""
+Archives of the tree sequences of replicates.
+
+Run as a module to compute statistics of every
+archived replicate in parallel:
+
+    python -m testutils.archive <archive directories> --outfile stats.csv
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import os
+import sys
+
+import numpy as np
+
+import testutils.scheduling
+import testutils.workers
+
+# tszip is imported by the functions that use it,
+# because it is only needed when archiving.
+
+
+def sample_sets(ts):
+    """
+    The sample nodes of ts, grouped by deme.
+    """
+    samples = ts.samples()
+    demes = ts.tables.nodes.population[samples]
+    return [samples[demes == i] for i in np.unique(demes)]
+
+
+class TreeArchive(object):
+    """
+    The tree sequences of replicates, simplified to
+    their sampled nodes and compressed with tszip.
+    Each replicate is one file, named by its seed.
+
+    Files are written under a temporary name and then
+    renamed, so that an archive being analyzed while
+    replicates run never holds a partial file.
+
+    path - the archive directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def filename(self, seed):
+        return os.path.join(self.path, f"{int(seed)}.trees.tsz")
+
+    def store(self, ts, sample_nodes, seed):
+        """
+        ts - the tskit.TreeSequence of a replicate
+        sample_nodes - list of node arrays, one per deme
+        seed - the seed of the replicate
+        """
+        import tszip
+
+        # Keep the population table, so that deme
+        # ids are the same as in the simulation.
+        ts = ts.simplify(samples=np.concatenate(sample_nodes), filter_populations=False)
+        tmpfile = f"{self.filename(seed)}.{os.getpid()}.tmp"
+        tszip.compress(ts, tmpfile)
+        os.replace(tmpfile, self.filename(seed))
+
+    def seeds(self):
+        return sorted(
+            int(i.split(".")[0]) for i in os.listdir(self.path) if i.endswith(".tsz")
+        )
+
+    def load(self, seed):
+        import tszip
+
+        return tszip.decompress(self.filename(seed))
+
+
+def _pairs(sets):
+    return [(i, j) for i in range(len(sets)) for j in range(i + 1, len(sets))]
+
+
+def diversity(ts, sets, mode):
+    return {f"diversity_{i}": v for i, v in enumerate(ts.diversity(sets, mode=mode))}
+
+
+def segregating_sites(ts, sets, mode):
+    values = ts.segregating_sites(sets, mode=mode)
+    return {f"segregating_sites_{i}": v for i, v in enumerate(values)}
+
+
+def tajimas_d(ts, sets, mode):
+    return {f"tajimas_d_{i}": v for i, v in enumerate(ts.Tajimas_D(sets, mode=mode))}
+
+
+def divergence(ts, sets, mode):
+    pairs = _pairs(sets)
+    values = ts.divergence(sets, indexes=pairs, mode=mode)
+    return {f"divergence_{i}_{j}": v for (i, j), v in zip(pairs, values)}
+
+
+def fst(ts, sets, mode):
+    pairs = _pairs(sets)
+    values = ts.Fst(sets, indexes=pairs, mode=mode)
+    return {f"fst_{i}_{j}": v for (i, j), v in zip(pairs, values)}
+
+
+# Statistics of one replicate, by name.  Each takes the
+# tree sequence, its per-deme sample sets and the tskit
+# mode, and returns a dict of named values.
+STATISTICS = {
+    "diversity": diversity,
+    "segregating_sites": segregating_sites,
+    "tajimas_d": tajimas_d,
+    "divergence": divergence,
+    "fst": fst,
+}
+
+
+def analyze(archive, seed, statistics, mode):
+    """
+    The named statistics of one archived replicate.
+
+    archive - a TreeArchive
+    statistics - names from STATISTICS
+    mode - "site" or "branch"
+    """
+    ts = archive.load(seed)
+    sets = sample_sets(ts)
+    values = {}
+    for name in statistics:
+        values.update(STATISTICS[name](ts, sets, mode))
+    return {k: float(v) for k, v in values.items()}
+
+
+def make_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Compute statistics of archived replicates", formatter_class=ADHF
+    )
+    parser.add_argument(
+        "archives", type=str, nargs="+", help="Archive directories written by --archive"
+    )
+    parser.add_argument(
+        "--statistics",
+        type=str,
+        nargs="+",
+        choices=sorted(STATISTICS.keys()),
+        default=["diversity", "tajimas_d", "fst"],
+        help="Statistics to compute",
+    )
+    parser.add_argument(
+        "--mode",
+        type=str,
+        choices=["site", "branch"],
+        default="site",
+        help="tskit mode of the statistics.  Use branch for archives "
+        "of runs with --stat_mode branch, which have no mutations.",
+    )
+    parser.add_argument(
+        "--nworkers",
+        type=int,
+        default=None,
+        help="Number of worker processes.  If None, one per CPU.",
+    )
+    parser.add_argument("--outfile", type=str, required=True, help="Output CSV file")
+    return parser
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+
+    tasks = []
+    for path in args.archives:
+        archive = TreeArchive(path)
+        tasks.extend((archive, seed) for seed in archive.seeds())
+
+    args.nworkers = testutils.workers.resolve_nworkers(args.nworkers)
+
+    rows = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.nworkers, mp_context=testutils.workers.pool_context()
+    ) as e:
+
+        def submit(task):
+            return e.submit(analyze, *task, args.statistics, args.mode)
+
+        for (archive, seed), f in testutils.scheduling.as_completed_bounded(
+            submit, tasks, args.nworkers
+        ):
+            row = {"archive": archive.path, "seed": seed}
+            row.update(f.result())
+            rows.append(row)
+
+    rows.sort(key=lambda row: (row["archive"], row["seed"]))
+    # Archives of models with different numbers of
+    # demes have different columns.
+    fieldnames = []
+    for row in rows:
+        fieldnames.extend(k for k in row if k not in fieldnames)
+    with open(args.outfile, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
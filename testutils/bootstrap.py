@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def bootstrap_means(stack, nboot, rng=None, chunk_size=1000):
+    """
+    Means of nboot bootstrap resamples of replicates.
+
+    stack - array of shape (nreps, ...), one entry
+            per replicate
+    nboot - number of resamples
+    rng - a numpy.random.Generator
+    chunk_size - number of resamples drawn at once,
+                 which bounds the memory used
+
+    Each chunk of resamples is an index array of shape
+    (chunk_size, nreps).  Its per-row counts of each
+    replicate form a weight matrix, and the resampled
+    means are that matrix times the flattened stack,
+    so there is no Python loop over resamples.
+
+    Returns an array of shape (nboot, ...).
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    stack = np.asarray(stack, dtype=np.float64)
+    nreps = stack.shape[0]
+    flat = stack.reshape(nreps, -1)
+    means = np.empty((nboot, flat.shape[1]))
+    for start in range(0, nboot, chunk_size):
+        n = min(chunk_size, nboot - start)
+        idx = rng.integers(0, nreps, size=(n, nreps))
+        idx += nreps * np.arange(n)[:, np.newaxis]
+        weights = np.bincount(idx.ravel(), minlength=n * nreps).reshape(n, nreps)
+        means[start : start + n] = (weights @ flat) / nreps
+    return means.reshape((nboot,) + stack.shape[1:])
+
+
+def confidence_band(stack, nboot, level=0.95, rng=None):
+    """
+    Percentile bootstrap interval of the mean
+    over replicates.
+
+    Returns (lower, upper), each with the shape
+    of one entry of stack.
+    """
+    means = bootstrap_means(stack, nboot, rng)
+    alpha = (1.0 - level) / 2.0
+    return np.quantile(means, [alpha, 1.0 - alpha], axis=0)
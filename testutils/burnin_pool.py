@@ -0,0 +1,111 @@
+import fcntl
+import hashlib
+import json
+import os
+
+import fwdpy11
+
+import testutils.ancestry
+
+
+class BurninPool(object):
+    """
+    Populations evolved to the end of the burn-in of
+    a neutral model, saved to disk for reuse.
+
+    Scenarios that only differ after the first demographic
+    event share the same ancestral parameters, and thus the
+    same pool.  The pool lives in a subdirectory of pooldir
+    named by a hash of those parameters.
+
+    Each member is evolved with its own seed, which only
+    depends on the parameters and its index.
+
+    pooldir - the directory holding all pools
+    model - a model dict from build_two_deme_IM_model.py
+    size - the number of members
+    """
+
+    def __init__(self, pooldir, model, size):
+        if model["mutations_are_neutral"] is False:
+            raise ValueError("burn-in pools require neutral mutations")
+        if model["ancestry"] != "forward":
+            raise ValueError("burn-in pools require forward ancestry")
+
+        first_event = model["pdict"]["demography"].metadata.split_time
+        self.parameters = {
+            "Nref": model["Nref"],
+            "genome_length": model["genome_length"],
+            "rho": model["rho"],
+            "burnin_generations": testutils.ancestry.burnin_end(first_event),
+            "fwdpy11": fwdpy11.__version__,
+        }
+        self.key = hashlib.sha256(
+            json.dumps(self.parameters, sort_keys=True).encode("utf8")
+        ).hexdigest()[:16]
+        self.path = os.path.join(pooldir, self.key)
+        self.size = size
+        self._recregions = model["pdict"]["recregions"]
+        self._gvalue = model["pdict"]["gvalue"]
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "parameters.json"), "w") as f:
+            json.dump(self.parameters, f, indent=2, sort_keys=True)
+
+    def filename(self, i):
+        return os.path.join(self.path, f"pop{i}.bin")
+
+    def missing(self):
+        """
+        Indexes of members that are not on disk yet.
+        """
+        return [i for i in range(self.size) if not os.path.exists(self.filename(i))]
+
+    def seed(self, i):
+        h = hashlib.sha256(f"{self.key}/{i}".encode("utf8")).hexdigest()
+        return int(h[:8], 16)
+
+    def build(self, i):
+        """
+        Evolve member i and write it to disk, unless it
+        is there already.
+
+        Builders of a member take turns holding a lock
+        file, so that runners sharing the pool evolve
+        each member exactly once.  The member is written
+        under a temporary name and then renamed, so that
+        readers never see a partial file.
+        """
+        with open(f"{self.filename(i)}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(self.filename(i)):
+                self._evolve(i)
+
+    def build_missing(self, executor):
+        """
+        Build the missing members in executor, a
+        concurrent.futures.Executor, and wait for them.
+        Run this before starting replicates from the
+        pool, so that they never build a member.
+        """
+        for f in [executor.submit(self.build, i) for i in self.missing()]:
+            f.result()
+
+    def _evolve(self, i):
+        pdict = {
+            "nregions": [],
+            "sregions": [],
+            "recregions": self._recregions,
+            "rates": (0.0, 0.0, None),
+            "gvalue": self._gvalue,
+            "demography": fwdpy11.DiscreteDemography(),
+            "simlen": self.parameters["burnin_generations"],
+        }
+        rng = fwdpy11.GSLrng(self.seed(i))
+        pop = fwdpy11.DiploidPopulation(
+            self.parameters["Nref"], self.parameters["genome_length"]
+        )
+        fwdpy11.evolvets(rng, pop, fwdpy11.ModelParams(**pdict), 100)
+        tmpfile = f"{self.filename(i)}.{os.getpid()}.tmp"
+        pop.dump_to_file(tmpfile)
+        os.replace(tmpfile, self.filename(i))
@@ -0,0 +1,105 @@
+import json
+import os
+
+import numpy as np
+
+import testutils.results_file
+
+
+class ReplicateLog(object):
+    """
+    Append-only record of finished replicates.
+
+    The run is described by a small JSON file, and the
+    results of each replicate are appended as one record
+    to a .npy file, by a results_file.ResultsFile.  Each
+    record holds the seed of its replicate.  Records are
+    flushed as soon as they are written, so that a killed
+    run can pick up where it stopped.  Nothing but the
+    seeds is kept in memory: read the results with
+    records(), which maps the file.
+
+    filename - the .npy file of records.  The description
+               of the run is written next to it, with the
+               extension .json.
+    header - dict describing the run.  An existing
+             log is only resumed if its header is
+             equal to this one.  Otherwise, it is
+             replaced.  Anything that changes the
+             results of a replicate must be in the
+             header, else a run could resume from a
+             stale log.
+    initial_seed - the seed used to generate the
+                   replicate seeds of a new run.
+                   When resuming, the value stored
+                   in the log is used instead.
+    dtype - a numpy structured dtype of the records,
+            with a "seed" field
+
+    After construction, self.completed maps the seeds
+    of finished replicates to their record numbers.
+    """
+
+    def __init__(self, filename, header, initial_seed, dtype):
+        self.filename = filename
+        self.header_filename = os.path.splitext(filename)[0] + ".json"
+        self.initial_seed = int(initial_seed)
+        self.completed = dict()
+
+        previous = _read_header(self.header_filename)
+        resume = previous is not None and previous["run"] == header
+        self._results = testutils.results_file.ResultsFile(filename, dtype, resume)
+        if resume is True and len(self._results) > 0:
+            self.initial_seed = previous["initial_seed"]
+            for i, seed in enumerate(self.records()["seed"]):
+                self.completed[int(seed)] = i
+        else:
+            _write_header(
+                self.header_filename, {"run": header, "initial_seed": self.initial_seed}
+            )
+
+    def append(self, seed, **results):
+        """
+        Record the results of the replicate run with seed.
+        Values may be floats or numpy arrays.
+        """
+        self._results.append(seed=seed, **results)
+        self.completed[int(seed)] = len(self._results) - 1
+
+    def records(self):
+        """
+        The records written so far, as a read-only
+        memory-mapped structured array.
+        """
+        return np.load(self.filename, mmap_mode="r")
+
+    def close(self):
+        self._results.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _read_header(filename):
+    """
+    Returns the description of an existing run,
+    or None if there is nothing usable.
+    """
+    try:
+        with open(filename, "r") as f:
+            header = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if "run" not in header:
+        return None
+    return header
+
+
+def _write_header(filename, header):
+    tmpfile = f"{filename}.{os.getpid()}.tmp"
+    with open(tmpfile, "w") as f:
+        json.dump(header, f)
+    os.replace(tmpfile, filename)
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class RunningMoments(object):
+    """
+    Streaming mean and variance of a scalar or array,
+    using Welford's algorithm.  Arrays are handled
+    element-wise.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self._m2 = None
+
+    def update(self, x):
+        x = np.array(x, dtype=np.float64)
+        self.n += 1
+        if self.mean is None:
+            self.mean = x
+            self._m2 = np.zeros_like(x)
+            return
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        """
+        The sample variance.
+        """
+        if self.n < 2:
+            return np.full_like(self._m2, np.inf)
+        return self._m2 / (self.n - 1)
+
+    def relative_ci_width(self, z=1.96):
+        """
+        Width of the normal confidence interval of the
+        mean, divided by the absolute value of the mean.
+        Entries whose mean is zero are nan.
+        """
+        width = 2.0 * z * np.sqrt(self.variance / self.n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.mean != 0.0, width / np.abs(self.mean), np.nan)
+
+
+class ConvergenceMonitor(object):
+    """
+    Decide when enough replicates have been run.
+
+    target - the largest allowed relative confidence
+             interval width over all statistics.
+             If None, only max_reps stops a run.
+    min_reps - never stop before this many replicates.
+    max_reps - always stop at this many replicates.
+    """
+
+    def __init__(self, target, min_reps, max_reps, z=1.96):
+        self.target = target
+        self.min_reps = min_reps
+        self.max_reps = max_reps
+        self.z = z
+        self.moments = dict()
+
+    @property
+    def n(self):
+        if len(self.moments) == 0:
+            return 0
+        return min(i.n for i in self.moments.values())
+
+    def update(self, **statistics):
+        for k, v in statistics.items():
+            if k not in self.moments:
+                self.moments[k] = RunningMoments()
+            self.moments[k].update(v)
+
+    def max_relative_ci_width(self):
+        widths = [np.ravel(i.relative_ci_width(self.z)) for i in self.moments.values()]
+        widths = np.concatenate(widths)
+        widths = widths[~np.isnan(widths)]
+        if len(widths) == 0:
+            return np.inf
+        return widths.max()
+
+    def converged(self):
+        if self.target is None or self.n < max(self.min_reps, 2):
+            return False
+        return bool(self.max_relative_ci_width() <= self.target)
+
+    def done(self):
+        return self.n >= self.max_reps or self.converged()
@@ -0,0 +1,44 @@
+import resource
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process, in MB.
+
+    On Linux, ru_maxrss is in kB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class MemoryBudget(object):
+    """
+    Chooses how many replicates may run at once, so
+    that their peak memory use fits in a budget.
+
+    Until the first replicate (the pilot) reports
+    its peak RSS, only one replicate runs.  After
+    that, the limit is the budget divided by the
+    largest peak RSS reported so far, so it goes
+    down if later replicates turn out to be larger.
+
+    budget_mb - the budget, in MB.  If None, the limit
+                is max_workers.
+    max_workers - the number of worker processes
+    """
+
+    def __init__(self, budget_mb, max_workers):
+        self.budget_mb = budget_mb
+        self.max_workers = max_workers
+        self.peak_rss_mb = None
+
+    def update(self, rss_mb):
+        if self.peak_rss_mb is None or rss_mb > self.peak_rss_mb:
+            self.peak_rss_mb = rss_mb
+
+    def max_in_flight(self):
+        if self.budget_mb is None:
+            return self.max_workers
+        if self.peak_rss_mb is None:
+            return 1
+        n = int(self.budget_mb // self.peak_rss_mb)
+        return max(1, min(self.max_workers, n))
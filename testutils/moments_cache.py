@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+
+
+def default_cache_dir():
+    """
+    $MOMENTS_CACHE_DIR if set, else a directory
+    under ~/.cache.
+    """
+    if "MOMENTS_CACHE_DIR" in os.environ:
+        return os.environ["MOMENTS_CACHE_DIR"]
+    return os.path.join(
+        os.path.expanduser("~"), ".cache", "fwdpy11_statistical_tests", "moments"
+    )
+
+
+# Entries have their own suffix, so that eviction never
+# removes other spectra kept in the same directory.
+_SUFFIX = ".moments_cache.fs"
+
+
+class MomentsCache(object):
+    """
+    On-disk cache of expected spectra from moments.
+
+    Entries are keyed by a hash of the model parameters,
+    sample sizes, selection parameters and the moments
+    version.  When the cache holds more than max_bytes,
+    the least recently used entries are removed.  Other
+    files in the cache directory are left alone.
+
+    cachedir - the cache directory.  If None, nothing is
+               cached.
+    max_bytes - the maximum size of the cache
+    """
+
+    def __init__(self, cachedir, max_bytes=1 << 30):
+        self.cachedir = cachedir
+        self.max_bytes = max_bytes
+        if cachedir is not None:
+            os.makedirs(cachedir, exist_ok=True)
+
+    def key(self, parameters):
+        """
+        parameters - a JSON-serializable dict describing
+                     everything that the spectrum depends on
+        """
+        # Imported here, so that runners that only need
+        # default_cache_dir do not load moments in workers.
+        import moments
+
+        parameters = dict(parameters)
+        parameters["moments"] = moments.__version__
+        canonical = json.dumps(parameters, sort_keys=True)
+        return hashlib.sha256(canonical.encode("utf8")).hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.cachedir, key + _SUFFIX)
+
+    def get(self, key):
+        """
+        Returns the cached moments.Spectrum or None.
+        """
+        if self.cachedir is None or not os.path.exists(self.filename(key)):
+            return None
+        # Mark as recently used
+        os.utime(self.filename(key))
+        import moments
+
+        return moments.Spectrum.from_file(self.filename(key))
+
+    def put(self, key, fs):
+        if self.cachedir is None:
+            return
+        tmpfile = f"{self.filename(key)}.{os.getpid()}.tmp"
+        fs.to_file(tmpfile)
+        os.replace(tmpfile, self.filename(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for i in os.listdir(self.cachedir):
+            if i.endswith(_SUFFIX):
+                st = os.stat(os.path.join(self.cachedir, i))
+                entries.append((st.st_mtime, st.st_size, i))
+        entries.sort()
+        total = sum(i[1] for i in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cachedir, name))
+            except FileNotFoundError:
+                # Removed by another process
+                pass
+            total -= size
+
+    def spectrum(self, parameters, integrate):
+        """
+        Returns the cached spectrum for parameters,
+        calling integrate() and caching the result
+        on a miss.
+        """
+        key = self.key(parameters)
+        fs = self.get(key)
+        if fs is None:
+            fs = integrate()
+            self.put(key, fs)
+        return fs
+
+
+def add_moments_cache_options(parser):
+    """
+    The options of the runners that choose the moments cache.
+    """
+    parser.add_argument(
+        "--moments_cache",
+        type=str,
+        default=default_cache_dir(),
+        help="Directory for cached moments spectra",
+    )
+    parser.add_argument(
+        "--moments_cache_max_mb",
+        type=float,
+        default=1024.0,
+        help="Maximum size of the moments cache, in MB",
+    )
+    parser.add_argument(
+        "--no_moments_cache",
+        action="store_true",
+        help="Always integrate with moments",
+    )
+
+
+def make_moments_cache(args):
+    """
+    The MomentsCache chosen by the options
+    from add_moments_cache_options.
+    """
+    cachedir = args.moments_cache
+    if args.no_moments_cache is True:
+        cachedir = None
+    return MomentsCache(cachedir, int(args.moments_cache_max_mb * 1024 * 1024))
@@ -0,0 +1,52 @@
+import functools
+
+import numpy as np
+
+# scipy is imported by the functions that use it, so
+# that worker processes do not load it.
+
+
+@functools.lru_cache(maxsize=None)
+def projection_matrix(n, m):
+    """
+    The hypergeometric probabilities of drawing j
+    derived copies in a subsample of m from a sample
+    of n with i derived copies.
+
+    Returns an array of shape (n + 1, m + 1).  Row i
+    is the distribution of j.  The same projection as
+    moments.Spectrum.project.
+    """
+    from scipy.stats import hypergeom
+
+    if m > n:
+        raise ValueError(f"cannot project a sample of {n} to {m}")
+    i = np.arange(n + 1)[:, np.newaxis]
+    j = np.arange(m + 1)[np.newaxis, :]
+    return hypergeom.pmf(j, n, i, m)
+
+
+def project(stack, sizes):
+    """
+    Project each fs in a stack to smaller sample sizes.
+
+    stack - array of shape (nreps, n0 + 1, n1 + 1, ...)
+    sizes - the haploid sample size of each deme after
+            projection
+
+    Returns an array of shape (nreps, sizes[0] + 1, ...).
+    Each entry of the first axis is the same as
+    moments.Spectrum.project of that fs, except that
+    the corners are not masked.
+
+    A projected fs averages over all subsamples of its
+    size, so its residuals from the expected fs, scaled
+    by the number of replicates, are smaller than those
+    of a sample of that size.
+    """
+    if len(sizes) != stack.ndim - 1:
+        raise ValueError("need one sample size per deme")
+    for axis, m in enumerate(sizes, start=1):
+        P = projection_matrix(stack.shape[axis] - 1, m)
+        stack = np.moveaxis(np.tensordot(stack, P, axes=([axis], [0])), -1, axis)
+    return stack
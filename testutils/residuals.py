@@ -0,0 +1,42 @@
+import numpy as np
+
+# moments is imported by the functions that use it,
+# so that worker processes do not load it.
+
+
+def summarize(model, data, nreps):
+    """
+    Root mean square and largest absolute value of the
+    Poisson residuals of the mean of nreps replicates.
+
+    The residuals are multiplied by sqrt(nreps), so that
+    each bin is roughly a standard normal deviate when
+    the simulations match moments.  Linkage makes them
+    somewhat overdispersed.
+
+    model - moments.Spectrum, scaled by theta
+    data - moments.Spectrum of the mean of the replicates
+    """
+    import moments
+
+    z = np.sqrt(nreps) * moments.Inference.linear_Poisson_residual(model, data)
+    z = np.ma.compressed(z)
+    return {"rms_z": np.sqrt(np.mean(z**2)), "max_abs_z": np.max(np.abs(z))}
+
+
+def two_deme_summary(model, data, nreps):
+    """
+    summarize for the joint fs and for the marginal
+    fs of each deme, with the columns prefixed by
+    joint, deme0 and deme1.
+    """
+    spectra = {
+        "joint": (model, data),
+        "deme0": (model.marginalize([1]), data.marginalize([1])),
+        "deme1": (model.marginalize([0]), data.marginalize([0])),
+    }
+    row = dict()
+    for name, (m, d) in spectra.items():
+        for k, v in summarize(m, d, nreps).items():
+            row[f"{name}_{k}"] = v
+    return row
@@ -0,0 +1,118 @@
+import os
+import struct
+
+import numpy as np
+
+_MAGIC = b"\x93NUMPY\x01\x00"
+
+# Room for the record count in the header.  The header
+# is always padded to the same length, so that it can be
+# rewritten in place whatever the number of records.
+_COUNT_WIDTH = 20
+
+
+def results_dtype(fs_shape, statistics=()):
+    """
+    One record per replicate: its seed, its mean Fst
+    over subsamples, and its mean joint fs.
+
+    statistics - (name, shape) of more per-replicate
+                 means to record
+    """
+    return np.dtype(
+        [("seed", np.uint64), ("fst", np.float64), ("fs", np.float64, fs_shape)]
+        + [(name, np.float64, shape) for name, shape in statistics]
+    )
+
+
+class ResultsFile(object):
+    """
+    Per-replicate results in a .npy file that grows
+    as replicates finish.
+
+    The file is a valid .npy file after each append,
+    so np.load(filename, mmap_mode="r") reads it,
+    with the dtype and number of records taken from
+    its header.
+
+    filename - the output file.  An existing file is
+               replaced, unless resume is True.
+    dtype - a numpy structured dtype
+    resume - keep the complete records of an existing
+             file with the same dtype, and append to it.
+             A partial record left by a killed run is
+             dropped.
+    """
+
+    def __init__(self, filename, dtype, resume=False):
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.n = 0
+        count = None
+        if resume is True:
+            count = _count_records(filename, self.dtype)
+        if count is not None:
+            self.n = count
+            self._f = open(filename, "r+b")
+            self._f.truncate(len(self._header()) + self.n * self.dtype.itemsize)
+        else:
+            self._f = open(filename, "w+b")
+        self._write_header()
+
+    def append(self, **fields):
+        record = np.zeros(1, dtype=self.dtype)
+        for k, v in fields.items():
+            record[k] = v
+        self._f.seek(0, os.SEEK_END)
+        self._f.write(record.tobytes())
+        self.n += 1
+        # The data are written before the count, so a killed
+        # run leaves a file whose header counts only complete
+        # records.
+        self._write_header()
+
+    def __len__(self):
+        return self.n
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _header(self):
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%*d,), }" % (
+            np.lib.format.dtype_to_descr(self.dtype),
+            _COUNT_WIDTH,
+            self.n,
+        )
+        # Pad with spaces, ending with a newline, so that the
+        # data start on a multiple of 64 bytes.
+        size = len(_MAGIC) + 2 + len(header) + 1
+        header += " " * (-size % 64) + "\n"
+        return _MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+    def _write_header(self):
+        self._f.seek(0)
+        self._f.write(self._header())
+        self._f.flush()
+
+
+def _count_records(filename, dtype):
+    """
+    The number of complete records in an existing
+    results file of the given dtype, or None if there
+    is no such file.
+    """
+    if not os.path.exists(filename):
+        return None
+    try:
+        records = np.load(filename, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if records.dtype != dtype:
+        return None
+    return len(records)
@@ -0,0 +1,46 @@
+import concurrent.futures
+
+
+def as_completed_bounded(submit, seeds, max_in_flight, stop=None):
+    """
+    Run submit(seed) for each seed, keeping at most
+    max_in_flight futures pending at once.
+
+    submit - callable returning a concurrent.futures.Future
+    seeds - iterable of seeds
+    max_in_flight - maximum number of pending futures,
+                    or a callable returning it.  A callable
+                    is called again whenever a future finishes,
+                    so that the limit can change during a run.
+    stop - optional callable.  Once it returns True,
+           no more seeds are submitted.  Futures that
+           are already pending are still waited on.
+
+    Yields (seed, future) as each future finishes.
+    """
+    seeds = iter(seeds)
+    pending = dict()
+
+    def limit():
+        if callable(max_in_flight):
+            return max_in_flight()
+        return max_in_flight
+
+    def fill():
+        while len(pending) < limit():
+            if stop is not None and stop():
+                return
+            try:
+                seed = next(seeds)
+            except StopIteration:
+                return
+            pending[submit(seed)] = seed
+
+    fill()
+    while len(pending) > 0:
+        done, _ = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for fut in done:
+            yield pending.pop(fut), fut
+        fill()
@@ -0,0 +1,111 @@
+import concurrent.futures
+import json
+import os
+
+import numpy as np
+
+import testutils.worker_state
+
+# Used by the runners when a model has not been tuned.
+DEFAULT_INTERVAL = 100
+
+
+def metadata_file(model_file):
+    """
+    Settings tuned for a model, such as its simplification
+    interval, are stored next to its file in this JSON
+    file.  Keeping them out of the model file means that
+    tuning does not change the hash that checkpoints of
+    the model are keyed on.
+    """
+    return os.path.splitext(model_file)[0] + "_metadata.json"
+
+
+def read_interval(model_file):
+    """
+    The tuned simplification interval of a model,
+    or DEFAULT_INTERVAL if it has not been tuned.
+    """
+    filename = metadata_file(model_file)
+    if not os.path.exists(filename):
+        return DEFAULT_INTERVAL
+    with open(filename, "r") as f:
+        return json.load(f)["simplification_interval"]
+
+
+def write_interval(model_file, interval, benchmark):
+    """
+    Store a tuned simplification interval, and a
+    description of the benchmark that chose it,
+    keeping any other settings of the model.
+    """
+    metadata = dict()
+    filename = metadata_file(model_file)
+    if os.path.exists(filename):
+        with open(filename, "r") as f:
+            metadata = json.load(f)
+    metadata["simplification_interval"] = interval
+    metadata["simplification_benchmark"] = benchmark
+    with open(filename, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def benchmark(setup, setup_args, trial, intervals, seeds):
+    """
+    Run trial(interval, seed) for each interval and seed.
+
+    Each trial gets a new worker process, initialized with
+    testutils.worker_state.initialize(setup, *setup_args),
+    so that its peak memory use is not that of an earlier
+    trial.
+
+    trial must return (seconds, peak RSS in MB).
+
+    Returns a list of dicts, one per trial.
+    """
+    results = []
+    for interval in intervals:
+        for seed in seeds:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1,
+                initializer=testutils.worker_state.initialize,
+                initargs=(setup,) + tuple(setup_args),
+            ) as e:
+                seconds, rss = e.submit(trial, interval, seed).result()
+            results.append(
+                {
+                    "interval": int(interval),
+                    "seed": int(seed),
+                    "seconds": seconds,
+                    "max_rss_mb": rss,
+                }
+            )
+    return results
+
+
+def best_interval(results, max_rss_mb=None):
+    """
+    The interval with the smallest mean time, among
+    those whose trials all stayed below max_rss_mb.
+    """
+    intervals = sorted(set(r["interval"] for r in results))
+    best = None
+    best_time = np.inf
+    for i in intervals:
+        trials = [r for r in results if r["interval"] == i]
+        if max_rss_mb is not None and max(r["max_rss_mb"] for r in trials) > max_rss_mb:
+            continue
+        t = np.mean([r["seconds"] for r in trials])
+        if t < best_time:
+            best, best_time = i, t
+    if best is None:
+        raise ValueError(f"no interval used less than {max_rss_mb} MB")
+    return best
+
+
+def print_results(results):
+    print("interval\tseed\tseconds\tmax_rss_mb")
+    for r in results:
+        print(
+            f"{r['interval']}\t{r['seed']}\t{r['seconds']:.3f}\t{r['max_rss_mb']:.1f}"
+        )
@@ -0,0 +1,247 @@
+"""
+Progress of a pool of replicates, written to a small
+JSON file while the pool runs.
+
+Run as a module to watch the status files of many runs:
+
+    python -m testutils.status output/
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+import testutils.workers
+
+
+def run_timed(fn, *args):
+    """
+    Call fn(*args) in a worker process.
+
+    Returns (pid, seconds, result), so that the
+    parent can tell which worker ran a replicate
+    and for how long.
+    """
+    start = time.monotonic()
+    result = fn(*args)
+    return os.getpid(), time.monotonic() - start, result
+
+
+class StatusWriter(object):
+    """
+    Counts finished replicates and rewrites filename
+    every interval seconds from a background thread,
+    so that the pool loop only pays for updating a
+    few counters.  The thread, and the clock of the
+    run, start when the writer is entered as a
+    context manager.
+
+    The file is written under a temporary name and
+    then renamed, so that readers never see a
+    partial file.
+
+    filename - the status file
+    total - the number of replicates to run.  With
+            a stopping rule, this is the maximum, so
+            the estimated time remaining is an upper
+            bound.
+    nworkers - the number of worker processes.  If
+               None, one per CPU, as in the runners.
+    interval - seconds between writes
+    """
+
+    def __init__(self, filename, total, nworkers, interval=5.0):
+        self.filename = filename
+        self.total = total
+        self.nworkers = testutils.workers.resolve_nworkers(nworkers)
+        self.interval = interval
+        self.completed = 0
+        self.failed = 0
+        self.state = "running"
+        self._workers = dict()
+        self._start = time.monotonic()
+        self._started = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, pid, seconds):
+        """
+        Record a replicate that ran on worker pid for seconds.
+        """
+        with self._lock:
+            self.completed += 1
+            w = self._workers.setdefault(pid, {"replicates": 0, "busy_seconds": 0.0})
+            w["replicates"] += 1
+            w["busy_seconds"] += seconds
+
+    def fail(self):
+        with self._lock:
+            self.failed += 1
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._start
+            rate = 60.0 * self.completed / elapsed if elapsed > 0 else 0.0
+            remaining = max(0, self.total - self.completed - self.failed)
+            eta = None
+            if self.state == "running" and rate > 0:
+                eta = 60.0 * remaining / rate
+            workers = {
+                str(pid): {
+                    "replicates": w["replicates"],
+                    "busy_seconds": w["busy_seconds"],
+                    "utilization": w["busy_seconds"] / elapsed if elapsed > 0 else 0.0,
+                }
+                for pid, w in self._workers.items()
+            }
+            return {
+                "state": self.state,
+                "started": self._started,
+                "updated": time.time(),
+                "elapsed_seconds": elapsed,
+                "total": self.total,
+                "completed": self.completed,
+                "failed": self.failed,
+                "replicates_per_minute": rate,
+                "eta_seconds": eta,
+                "nworkers": self.nworkers,
+                "workers": workers,
+            }
+
+    def close(self, state="finished"):
+        """
+        Stop the background thread and write the
+        final status.
+        """
+        with self._lock:
+            self.state = state
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._write()
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        self._started = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close("failed" if exc_type is not None else "finished")
+
+    def _run(self):
+        self._write()
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        tmpfile = f"{self.filename}.{os.getpid()}.tmp"
+        with open(tmpfile, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmpfile, self.filename)
+
+
+def find_status_files(paths):
+    """
+    The status files named by paths.  Directories
+    are searched recursively for *status.json.
+    """
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files.extend(
+                sorted(glob.glob(os.path.join(p, "**", "*status.json"), recursive=True))
+            )
+        else:
+            files.append(p)
+    return files
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def format_table(files):
+    """
+    One line per status file, followed by the summed
+    utilization of each worker over all files.  Runs
+    sharing one pool report the same worker pids.
+    """
+    lines = [
+        f"{'status file':<60} {'state':>8} {'done':>11} {'failed':>6} "
+        f"{'reps/min':>8} {'eta':>9} {'util min':>8} {'util mean':>9}"
+    ]
+    workers = dict()
+    for filename in files:
+        try:
+            with open(filename, "r") as f:
+                status = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            lines.append(f"{filename:<60} {'missing':>8}")
+            continue
+        util = [w["utilization"] for w in status["workers"].values()]
+        # Workers that never finished a replicate are idle
+        util += [0.0] * max(0, (status["nworkers"] or 0) - len(util))
+        for pid, w in status["workers"].items():
+            workers[pid] = workers.get(pid, 0.0) + w["utilization"]
+        done = f"{status['completed']}/{status['total']}"
+        lines.append(
+            f"{filename:<60} {status['state']:>8} {done:>11} {status['failed']:>6} "
+            f"{status['replicates_per_minute']:>8.2f} "
+            f"{format_seconds(status['eta_seconds']):>9} "
+            f"{min(util, default=0.0):>8.0%} "
+            f"{sum(util) / max(1, len(util)):>9.0%}"
+        )
+    if len(workers) > 0:
+        lines.append("")
+        lines.append(
+            "worker utilization: "
+            + " ".join(f"{pid}:{u:.0%}" for pid, u in sorted(workers.items()))
+        )
+    return "\n".join(lines)
+
+
+def make_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Watch the status files of running replicate pools", formatter_class=ADHF
+    )
+    parser.add_argument(
+        "paths",
+        type=str,
+        nargs="*",
+        default=["."],
+        help="Status files, or directories to search for *status.json",
+    )
+    parser.add_argument(
+        "--interval", type=float, default=5.0, help="Seconds between refreshes"
+    )
+    parser.add_argument("--once", action="store_true", help="Print once and exit")
+    return parser
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+
+    while True:
+        table = format_table(find_status_files(args.paths))
+        if args.once:
+            print(table)
+            break
+        # Clear the terminal before each refresh
+        sys.stdout.write("\033[H\033[J" + table + "\n")
+        sys.stdout.flush()
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            break
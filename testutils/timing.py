@@ -0,0 +1,163 @@
+"""
+Timings of the phases of replicates.
+
+Run as a module to summarize the timings of many runs
+in an HTML table:
+
+    python -m testutils.timing a/timings.jsonl b/timings.jsonl \
+        --labels a b --outfile timings.html
+"""
+
+import argparse
+import json
+import sys
+import time
+
+
+def table_sizes(tables):
+    return {
+        "nodes": len(tables.nodes),
+        "edges": len(tables.edges),
+        "mutations": len(tables.mutations),
+    }
+
+
+class PhaseTimer(object):
+    """
+    Wall-clock time and table sizes of the
+    phases of one replicate.
+
+    Each call to mark ends the current phase
+    and starts the next one.  self.phases is
+    a list of dicts, one per phase, that can
+    be returned from a worker process.
+    """
+
+    def __init__(self):
+        self.phases = []
+        self._start = time.monotonic()
+
+    def mark(self, phase, tables):
+        now = time.monotonic()
+        record = {"phase": phase, "seconds": now - self._start}
+        record.update(table_sizes(tables))
+        self.phases.append(record)
+        self._start = now
+
+    def recorder(self, phase, generation):
+        """
+        A recorder for fwdpy11.evolvets that ends phase
+        at the end of the given generation.
+
+        If the population is already past generation
+        when evolvets starts, the phase is never ended
+        by the recorder, so call mark before evolvets.
+        """
+
+        def record(pop, sampler):
+            if pop.generation == generation:
+                self.mark(phase, pop.tables)
+
+        return record
+
+
+class TimingLog(object):
+    """
+    One line of JSON per replicate, holding its
+    seed and the phases of its PhaseTimer.
+
+    filename - the output file
+    append - keep existing lines, e.g. when
+             resuming from a checkpoint.  The
+             timings of replicates from an
+             interrupted run are then kept, like
+             their results.
+    """
+
+    def __init__(self, filename, append):
+        self._f = open(filename, "a" if append else "w")
+
+    def append(self, seed, phases):
+        self._f.write(json.dumps({"seed": int(seed), "phases": phases}) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_timings(filename):
+    """
+    Returns a pandas.DataFrame with one row per
+    replicate and phase.
+    """
+    # Imported here, so that workers, which use
+    # PhaseTimer, never load pandas.
+    import pandas as pd
+
+    with open(filename, "r") as f:
+        records = [json.loads(line) for line in f if line.endswith("\n")]
+    return pd.json_normalize(records, record_path="phases", meta=["seed"])
+
+
+def summarize(label, df):
+    """
+    Mean time and table sizes of each phase,
+    in the order in which the phases happen.
+    """
+    import pandas as pd
+
+    g = df.groupby("phase", sort=False)
+    s = g[["seconds", "nodes", "edges", "mutations"]].mean()
+    s["fraction"] = s["seconds"] / s["seconds"].sum()
+    s["replicates"] = g["seed"].nunique()
+    s.index = pd.MultiIndex.from_product([[label], s.index], names=["model", "phase"])
+    return s
+
+
+def make_parser():
+    parser = argparse.ArgumentParser("Summarize the per-phase timings of replicates")
+    parser.add_argument(
+        "timings",
+        type=str,
+        nargs="+",
+        help="Files written by a TimingLog",
+    )
+    parser.add_argument(
+        "--labels",
+        type=str,
+        nargs="+",
+        default=None,
+        help="The name of the model of each file.  If None, the file names.",
+    )
+    parser.add_argument("--outfile", type=str, required=True, help="Output HTML file")
+    return parser
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+
+    labels = args.labels
+    if labels is None:
+        labels = args.timings
+    if len(labels) != len(args.timings):
+        raise ValueError("--labels must name each timings file")
+
+    import pandas as pd
+
+    summary = pd.concat(
+        [summarize(label, read_timings(i)) for label, i in zip(labels, args.timings)]
+    )
+    with open(args.outfile, "w") as f:
+        f.write("<h1>Time spent per replicate</h1>\n")
+        f.write(
+            "<p>Mean wall-clock seconds and table sizes at the end of "
+            "each phase.  fraction is the share of the total time.</p>\n"
+        )
+        f.write(summary.to_html(float_format=lambda x: f"{x:.3g}"))
@@ -0,0 +1,312 @@
+import argparse
+
+
+def make_model_builder_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Building two deme IM models", formatter_class=ADHF
+    )
+    parser.add_argument(
+        "--split", "-s", type=float, help="Fraction that splits into deme 0"
+    )
+    parser.add_argument(
+        "--tsplit",
+        "-T",
+        type=float,
+        help="Time since population split," " in units of 2*Nref generations",
+    )
+    parser.add_argument("--seed", type=int, help="Random number seed")
+
+    parser.add_argument(
+        "--outdir", type=str, default=None, help="Output directory name"
+    )
+
+    optional = parser.add_argument_group("Optional")
+    optional.add_argument(
+        "--Nref", type=int, default=1000, help="Ancestral population size"
+    )
+    optional.add_argument(
+        "--N0",
+        type=float,
+        default=1.0,
+        help="Contemporary size of deme 0, relative to Nref",
+    )
+    optional.add_argument(
+        "--N1",
+        type=float,
+        default=1.0,
+        help="Contemporary size of deme 1, relative to Nref",
+    )
+    optional.add_argument("--gamma", type=float, help="2Ns")
+    # Require 0 <= h <= 2
+    optional.add_argument("-H", type=float, default=1.0, help="Dominance")
+    optional.add_argument(
+        "--migrates",
+        "-M",
+        type=float,
+        nargs=2,
+        default=[0.0, 0.0],
+        help="Migration rates, scaled by 2*Nref.",
+    )
+    optional.add_argument(
+        "--theta",
+        type=float,
+        default=1.0,
+        help="Scaled mutation rate. " "Danger zone with selection :).",
+    )
+    optional.add_argument(
+        "--rho",
+        type=float,
+        default=1e3,
+        help="Scaled recombination rate, rho = 4*Nref*r",
+    )
+    optional.add_argument(
+        "--sample_times",
+        type=float,
+        nargs="*",
+        default=[],
+        help="Times since the split, in units of 2*Nref generations, "
+        "at which to also sample each replicate.  Each must be "
+        "less than --tsplit.  The end of the simulation is always sampled.",
+    )
+    return parser
+
+
+def make_model_runner_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser("Running two deme IM models", formatter_class=ADHF)
+
+    parser.add_argument("--infile", type=str, default=None, help="Pickled model file")
+    parser.add_argument(
+        "--outdir", type=str, default=None, help="Output directory name"
+    )
+    parser.add_argument(
+        "--nsam",
+        type=int,
+        default=None,
+        help="Number of diploids to sample from each deme",
+    )
+    parser.add_argument(
+        "--num_subsamples", type=int, default=None, help="Number of subsamples to take"
+    )
+    add_replicate_options(parser)
+
+    return parser
+
+
+def make_batch_runner_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Running many two deme IM models in one process pool", formatter_class=ADHF
+    )
+
+    parser.add_argument(
+        "--scenarios",
+        type=str,
+        default=None,
+        help="Tab-separated table of scenarios.  Each row needs "
+        "name, nsam and num_subsamples columns.",
+    )
+    parser.add_argument(
+        "--outroot",
+        type=str,
+        default=None,
+        help="Directory holding one output directory per scenario, "
+        "named after the scenario and containing its model.pickle",
+    )
+    add_replicate_options(parser)
+
+    return parser
+
+
+def make_sweep_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Running a grid of two deme IM models", formatter_class=ADHF
+    )
+
+    grid = parser.add_argument_group(
+        "Grid", "Every combination of these values is one grid point"
+    )
+    grid.add_argument(
+        "--N0",
+        type=float,
+        nargs="+",
+        default=[1.0],
+        help="Contemporary sizes of deme 0, relative to Nref",
+    )
+    grid.add_argument(
+        "--N1",
+        type=float,
+        nargs="+",
+        default=[1.0],
+        help="Contemporary sizes of deme 1, relative to Nref",
+    )
+    grid.add_argument(
+        "--split",
+        type=float,
+        nargs="+",
+        default=[0.5],
+        help="Fractions that split into deme 0",
+    )
+    grid.add_argument(
+        "--tsplit",
+        type=float,
+        nargs="+",
+        default=[0.1],
+        help="Times since population split, in units of 2*Nref generations",
+    )
+    grid.add_argument(
+        "--m01",
+        type=float,
+        nargs="+",
+        default=[0.0],
+        help="Migration rates into deme 0, scaled by 2*Nref",
+    )
+    grid.add_argument(
+        "--m10",
+        type=float,
+        nargs="+",
+        default=[0.0],
+        help="Migration rates into deme 1, scaled by 2*Nref",
+    )
+
+    parser.add_argument(
+        "--Nref", type=int, default=1000, help="Ancestral population size"
+    )
+    parser.add_argument(
+        "--theta", type=float, default=100.0, help="Scaled mutation rate"
+    )
+    parser.add_argument(
+        "--rho",
+        type=float,
+        default=1e3,
+        help="Scaled recombination rate, rho = 4*Nref*r",
+    )
+    parser.add_argument(
+        "--ancestry",
+        type=str,
+        choices=["forward", "msprime"],
+        default="forward",
+        help="Use a forward burn-in or msprime for the ancestral population.",
+    )
+    parser.add_argument(
+        "--nsam",
+        type=int,
+        default=15,
+        help="Number of diploids to sample from each deme",
+    )
+    parser.add_argument(
+        "--num_subsamples", type=int, default=1, help="Number of subsamples to take"
+    )
+    parser.add_argument(
+        "--outroot",
+        type=str,
+        default=None,
+        help="Directory holding one output directory per grid point, "
+        "and the table of residual statistics",
+    )
+    add_replicate_options(parser)
+
+    return parser
+
+
+def add_common_replicate_options(parser, monitored):
+    """
+    Options shared by every runner of replicates,
+    including plot_model_residuals.py of the demes
+    models.
+
+    monitored - describes what --target_ci_width
+                applies to, e.g. "every fs bin"
+    """
+    parser.add_argument(
+        "--memory_budget",
+        type=float,
+        default=None,
+        help="Memory budget in MB.  The number of concurrent replicates "
+        "is chosen from the peak memory use of a pilot replicate, and "
+        "is at most the number of workers.  If None, run one replicate "
+        "per worker at once.",
+    )
+    parser.add_argument(
+        "--target_ci_width",
+        type=float,
+        default=None,
+        help="Stop adding replicates once the 95%% confidence interval "
+        f"of the mean of {monitored} is narrower than "
+        "this fraction of the mean.  If None, run --nreps replicates.",
+    )
+    parser.add_argument(
+        "--min_reps",
+        type=int,
+        default=16,
+        help="Minimum number of replicates when using --target_ci_width",
+    )
+    parser.add_argument(
+        "--stat_mode",
+        type=str,
+        choices=["site", "branch"],
+        default="site",
+        help="site: place mutations and count them.  "
+        "branch: use the expected fs given the genealogies, "
+        "which has no mutational variance.  Neutral models only.",
+    )
+    parser.add_argument(
+        "--archive",
+        action="store_true",
+        help="Store each replicate's tree sequence, simplified to its "
+        "sampled nodes.  See python -m testutils.archive.",
+    )
+
+
+def add_replicate_options(parser):
+    """
+    Options shared by the single-model and batch runners.
+    """
+    add_common_replicate_options(parser, "every fs bin and of Fst")
+    parser.add_argument(
+        "--nreps",
+        type=int,
+        default=None,
+        help="Number of replicates to run.  "
+        "With --target_ci_width, the maximum number of replicates.",
+    )
+    parser.add_argument(
+        "--nworkers",
+        type=int,
+        default=None,
+        help="Number of worker processes.  If None, one per CPU.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Initial random number seed. If None, one is chosen at random.  "
+        "When running several scenarios, each one's seed is derived "
+        "from this seed and its name.",
+    )
+    parser.add_argument(
+        "--fs_method",
+        type=str,
+        choices=["tskit", "fwdpy11"],
+        default="tskit",
+        help="Calculate the fs with tskit or with fwdpy11's tables",
+    )
+    parser.add_argument(
+        "--burnin_pool",
+        type=str,
+        default=None,
+        help="Directory of burn-in pools.  If None, each replicate "
+        "runs its own burn-in.",
+    )
+    parser.add_argument(
+        "--statistics",
+        type=str,
+        nargs="*",
+        choices=["hudson_fst", "dxy", "pi", "segregating_sites", "tajimas_d"],
+        default=[],
+        help="Statistics to record for each replicate, besides Fst.  "
+        "They are computed from the same joint fs, and compared "
+        "to moments in the plots.",
+    )
@@ -0,0 +1,22 @@
+"""
+Per-process state of replicate workers.
+
+Pass initialize and (setup, arg1, arg2, ...) as the
+initializer and initargs of a ProcessPoolExecutor.
+Each worker then runs setup(arg1, arg2, ...) once,
+and tasks read the result with get().  Tasks only
+need to carry their seeds.
+"""
+
+_STATE = None
+
+
+def initialize(setup, *args):
+    global _STATE
+    _STATE = setup(*args)
+
+
+def get():
+    if _STATE is None:
+        raise RuntimeError("worker state has not been initialized")
+    return _STATE
@@ -0,0 +1,106 @@
+"""
+Start-up of the worker processes that run replicates.
+
+Run as a module, from the directory of a runner, to
+time how long a pool of its workers takes to start
+with each start method:
+
+    python -m testutils.workers --module two_deme_IM_worker
+    python -m testutils.workers --module residuals_worker
+"""
+
+import argparse
+import concurrent.futures
+import importlib
+import multiprocessing
+import os
+import sys
+import time
+
+# Imported once by the fork server.  Workers forked
+# from it start with these already loaded.
+PRELOAD = ["fwdpy11", "tskit", "numpy"]
+
+
+def pool_context():
+    """
+    The multiprocessing context for replicate pools.
+
+    Workers are forked from a server process that has
+    only imported PRELOAD.  Unlike with "fork", they do
+    not inherit the runner's threads or plotting modules,
+    and unlike with "spawn", they do not import fwdpy11
+    from scratch.
+    """
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(PRELOAD)
+    return context
+
+
+def resolve_nworkers(nworkers):
+    """
+    The number of worker processes to start:
+    nworkers, or one per CPU if it is None.
+    """
+    if nworkers is None:
+        return os.cpu_count()
+    return nworkers
+
+
+def startup_seconds(context, nworkers, module):
+    """
+    Wall time to start a pool of nworkers workers, import
+    module in each of them, and shut the pool down.
+    """
+    start = time.monotonic()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=nworkers,
+        mp_context=context,
+        initializer=importlib.import_module,
+        initargs=(module,),
+    ) as e:
+        for f in [e.submit(os.getpid) for _ in range(nworkers)]:
+            f.result()
+    return time.monotonic() - start
+
+
+def make_parser():
+    ADHF = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        "Time the start-up of replicate pools", formatter_class=ADHF
+    )
+    parser.add_argument(
+        "--module",
+        type=str,
+        default="numpy",
+        help="Module that each worker imports, as a worker of a runner would",
+    )
+    parser.add_argument(
+        "--nworkers", type=int, default=4, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--ntrials", type=int, default=3, help="Number of pools per start method"
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args(sys.argv[1:])
+
+    contexts = {
+        "fork": multiprocessing.get_context("fork"),
+        "spawn": multiprocessing.get_context("spawn"),
+        "forkserver": pool_context(),
+    }
+    print(f"{'start method':<12} {'first':>8} {'best':>8} {'per worker':>10}")
+    for name, context in contexts.items():
+        seconds = [
+            startup_seconds(context, args.nworkers, args.module)
+            for _ in range(args.ntrials)
+        ]
+        # The first forkserver pool also starts the server
+        print(
+            f"{name:<12} {seconds[0]:>8.3f} {min(seconds):>8.3f} "
+            f"{min(seconds) / args.nworkers:>10.3f}"
+        )